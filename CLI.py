@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+
+from utils.config import Config
+from utils.tools import get_new_id
+from utils.parser import URLParser
+from utils.task import DownloadUtils
+from utils.download import create_downloader, info_service
+from utils.prefetch import playurl_prefetcher
+from utils.merge import merge_queue
+
+class Reporter:
+    # 每个事件输出一行 json，供脚本或其他程序读取
+    def __init__(self, stream = sys.stdout):
+        self.stream = stream
+
+        self.lock = threading.Lock()
+
+    def emit(self, event: str, **kwargs):
+        line = json.dumps({"event": event, "time": round(time.time(), 3), **kwargs}, ensure_ascii = False)
+
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+class HeadlessDownloader:
+    def __init__(self, args):
+        self.args, self.reporter = args, Reporter()
+
+        # 队列长度有限，解析速度快于下载时阻塞解析线程，待下载任务再多也只保留少量已解析的任务
+        self.queue = queue.Queue(maxsize = max(args.max_download * 2, Config.Download.prefetch_count))
+
+        self.lock = threading.Lock()
+        self.merge_condition = threading.Condition(self.lock)
+
+        self.merging = self.completed = self.failed = 0
+
+        # 数据库中未完成的任务仍在使用其 id 对应的临时文件，新任务不能重复使用
+        self.records = info_service.read()
+        self.ids = {int(key) for key in self.records}
+
+        self.keys = set()
+
+    def run(self) -> int:
+        workers = [threading.Thread(target = self.worker, name = "CLIWorkerThread", daemon = True) for i in range(self.args.max_download)]
+
+        for worker in workers:
+            worker.start()
+
+        if self.args.resume:
+            self.add_resume_tasks()
+
+        parser = URLParser()
+
+        for url in self.read_urls():
+            try:
+                entry_list = parser.parse(url, self.args.resolution, self.args.no_cache)
+
+            except Exception as e:
+                self.report_error(None, url = url, message = f"解析失败：{e}")
+                continue
+
+            for entry in entry_list:
+                self.add_task(entry)
+
+        for worker in workers:
+            self.queue.put(None)
+
+        for worker in workers:
+            worker.join()
+
+        with self.merge_condition:
+            self.merge_condition.wait_for(lambda: not self.merging)
+
+        self.reporter.emit("finished", completed = self.completed, failed = self.failed)
+
+        return 1 if self.failed else 0
+
+    def read_urls(self):
+        # 按行读取，空行与 # 开头的行忽略；从标准输入读取时逐行处理，可持续接收新的链接
+        for url in self.args.url:
+            yield url
+
+        for path in self.args.input or ([] if self.args.url else ["-"]):
+            file = sys.stdin if path == "-" else open(path, "r", encoding = "utf-8")
+
+            with file:
+                for line in file:
+                    line = line.strip()
+
+                    if line and not line.startswith("#"):
+                        yield line
+
+    def add_resume_tasks(self):
+        # 与界面启动时相同，恢复上次未完成的任务
+        for key, value in self.records.items():
+            entry = value["base_info"]
+            entry["status"] = "wait"
+
+            if value["thread_info"]:
+                entry["thread_info"] = value["thread_info"]
+
+            self.add_task(entry, resume = True)
+
+    def add_task(self, entry: dict, resume: bool = False):
+        key = (entry["bvid"], entry["cid"])
+
+        with self.lock:
+            if key in self.keys:
+                return
+
+            self.keys.add(key)
+
+            # 恢复的任务使用保存的 id，新任务的 id 仍需避开已占用的 id
+            while not resume and entry["id"] in self.ids:
+                entry["id"] = get_new_id()
+
+            self.ids.add(entry["id"])
+
+        self.reporter.emit("queued", id = entry["id"], title = entry["title"], bvid = entry["bvid"], cid = entry["cid"])
+
+        self.queue.put(entry)
+
+    def worker(self):
+        while True:
+            info = self.queue.get()
+
+            if info is None:
+                break
+
+            self.prefetch()
+
+            try:
+                HeadlessTask(self, info).start()
+
+            except Exception as e:
+                self.report_error(info, message = f"下载失败：{e}")
+
+    def prefetch(self):
+        # 获取队列中接下来几个任务的下载链接，当前任务结束后可直接开始传输
+        with self.queue.mutex:
+            wait_list = [info for info in list(self.queue.queue)[:Config.Download.prefetch_count] if info]
+
+        for info in wait_list:
+            playurl_prefetcher.prefetch(info["id"], DownloadUtils(info, None).request_video_durl_json)
+
+    def submit_merge(self, task):
+        with self.lock:
+            self.merging += 1
+
+        merge_queue.submit(task.downloader.total_size, task.utils.merge_video, task.onMergeProgress, task.onMergeComplete, task.utils.is_stream_merging())
+
+    def finish_merge(self, task, result: bool):
+        if result:
+            self.reporter.emit("completed", id = task.info["id"], title = task.info["title"])
+
+            with self.lock:
+                self.completed += 1
+
+                self.ids.discard(task.info["id"])
+        else:
+            self.report_error(task.info, message = "合成视频失败")
+
+        with self.merge_condition:
+            self.merging -= 1
+
+            self.merge_condition.notify_all()
+
+    def report_error(self, info: dict, **kwargs):
+        if info:
+            kwargs.update(id = info["id"], title = info["title"])
+
+        self.reporter.emit("error", **kwargs)
+
+        with self.lock:
+            self.failed += 1
+
+class HeadlessTask:
+    def __init__(self, parent: HeadlessDownloader, info: dict):
+        self.parent, self.reporter, self.info = parent, parent.reporter, info
+
+        self.downloader = create_downloader(self.info, self.onStart, self.onDownload, self.onMerge, self.onDownloadError, self.onRefresh)
+        self.utils = DownloadUtils(self.info, self.onError)
+
+    def start(self):
+        info_list = self.utils.get_download_info()
+
+        thread_info = self.info.pop("thread_info", None)
+
+        if thread_info and self.utils.get_resume_info(thread_info, info_list):
+            if self.downloader.resume(thread_info):
+                return
+
+        self.downloader.start(info_list)
+
+    def onStart(self):
+        self.reporter.emit("start", id = self.info["id"], title = self.info["title"], total_size = self.downloader.total_size, resolution = self.utils.resolution, codec_id = self.utils.codec_id)
+
+        self.utils.start_stream_merge(self.downloader)
+
+    def onDownload(self, info: dict):
+        self.reporter.emit("progress", id = self.info["id"], progress = info["progress"], completed_size = self.downloader.completed_size, total_size = self.downloader.total_size, speed = info["speed"], eta = info["eta"])
+
+    def onMerge(self):
+        self.reporter.emit("merging", id = self.info["id"])
+
+        self.parent.submit_merge(self)
+
+    def onMergeProgress(self, progress: int):
+        self.reporter.emit("merge_progress", id = self.info["id"], progress = progress)
+
+    def onMergeComplete(self, result: bool):
+        self.downloader.download_info.clear()
+
+        self.parent.finish_merge(self, result)
+
+    def onRefresh(self) -> list:
+        return DownloadUtils(self.info, self.onError).get_download_info()
+
+    def onError(self):
+        raise RuntimeError("无法获取下载链接")
+
+    def onDownloadError(self):
+        # 保留下载记录，之后可使用 --resume 或在界面中继续下载
+        self.utils.stop_stream_merge()
+
+        self.parent.report_error(self.info, message = "下载失败：重试次数已用尽")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Bili23 Downloader 命令行模式，不依赖图形界面，进度以 json lines 格式输出到标准输出")
+    parser.add_argument("url", nargs = "*", help = "视频、番剧或活动页链接")
+    parser.add_argument("-i", "--input", action = "append", help = "从文件读取链接，每行一个，- 表示标准输入；未指定链接与文件时从标准输入读取")
+    parser.add_argument("-o", "--output", help = "下载目录，默认使用配置文件中的设置")
+    parser.add_argument("-r", "--resolution", type = int, help = "清晰度 id，如 80 (1080P)，默认使用配置文件中的设置")
+    parser.add_argument("-n", "--max-download", type = int, default = Config.Download.max_download, help = "并行下载数")
+    parser.add_argument("--resume", action = "store_true", help = "继续下载上次未完成的任务")
+    parser.add_argument("--no-cache", action = "store_true", help = "解析时忽略接口缓存")
+    args = parser.parse_args()
+
+    args.max_download = max(args.max_download, 1)
+
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.output:
+        Config.Download.path = os.path.abspath(args.output)
+
+        os.makedirs(Config.Download.path, exist_ok = True)
+
+    try:
+        sys.exit(HeadlessDownloader(args).run())
+
+    except KeyboardInterrupt:
+        # 已下载的分片进度在退出时写入数据库
+        sys.exit(130)
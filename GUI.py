@@ -2,6 +2,7 @@ import wx
 import ctypes
 
 from gui.main import MainWindow
+from utils.dispatch import set_handler
 
 if __name__ == "__main__":
     ctypes.windll.shcore.SetProcessDpiAwareness(2)
@@ -9,6 +10,9 @@ if __name__ == "__main__":
     app = wx.App()
     app.SetAppName("Bili23 Downloader")
 
+    # 下载、合并线程的回调转到 UI 线程中执行
+    set_handler(wx.CallAfter)
+
     main_window = MainWindow(None)
     main_window.Show()
 
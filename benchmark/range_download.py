@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import tempfile
+import requests
+import argparse
+from threading import Thread
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.writer import ChunkWriter
+
+class RangeHandler(BaseHTTPRequestHandler):
+    data = b""
+
+    def do_GET(self):
+        start, end = self.headers["Range"].split("=")[1].split("-")
+        start, end = int(start), min(int(end), len(self.data) - 1)
+
+        self.send_response(206)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.data)}")
+        self.end_headers()
+
+        view = memoryview(self.data)[start:end + 1]
+
+        for offset in range(0, len(view), 1048576):
+            self.wfile.write(view[offset:offset + 1048576])
+
+    def log_message(self, *args):
+        pass
+
+def legacy_download(url: str, path: str, chunk_list: list):
+    req = requests.get(url, headers = {"Range": "bytes={}-{}".format(*chunk_list)}, stream = True)
+
+    with open(path, "rb+") as f:
+        f.seek(chunk_list[0])
+
+        for chunk in req.iter_content(chunk_size = 1024):
+            if chunk:
+                f.write(chunk)
+                f.flush()
+
+def buffered_download(url: str, path: str, chunk_list: list, chunk_size: int, buffer_size: int):
+    req = requests.get(url, headers = {"Range": "bytes={}-{}".format(*chunk_list)}, stream = True)
+
+    with ChunkWriter(path, chunk_list, buffer_size) as writer:
+        for chunk in req.iter_content(chunk_size = chunk_size):
+            if chunk:
+                writer.write(chunk)
+
+def run(target, url: str, path: str, size: int, threads: int, *args) -> float:
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+    piece = size // threads
+    thread_list = [Thread(target = target, args = (url, path, [i * piece, (i + 1) * piece - 1 if i != threads - 1 else size - 1], *args)) for i in range(threads)]
+
+    start_time = time.perf_counter()
+
+    for thread in thread_list:
+        thread.start()
+
+    for thread in thread_list:
+        thread.join()
+
+    return time.perf_counter() - start_time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "对比 range_download 旧写入方式与缓冲写入方式的吞吐量")
+    parser.add_argument("--size", type = int, default = 512, help = "测试文件大小 (MB)")
+    parser.add_argument("--threads", type = int, default = 4)
+    parser.add_argument("--chunk-size", type = int, default = 1, help = "单次读取大小 (MB)")
+    parser.add_argument("--buffer-size", type = int, default = 4, help = "写入缓冲大小 (MB)")
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    RangeHandler.data = os.urandom(size)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    Thread(target = server.serve_forever, daemon = True).start()
+
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "bench.bin")
+
+        legacy_time = run(legacy_download, url, path, size, args.threads)
+
+        buffered_time = run(buffered_download, url, path, size, args.threads, args.chunk_size * 1024 * 1024, args.buffer_size * 1024 * 1024)
+
+        with open(path, "rb") as f:
+            assert f.read() == RangeHandler.data, "写入内容与源数据不一致"
+
+    server.shutdown()
+
+    print("legacy   (1 KB write + flush): {:.1f} MB/s".format(args.size / legacy_time))
+    print("buffered ({} MB read, {} MB buffer): {:.1f} MB/s".format(args.chunk_size, args.buffer_size, args.size / buffered_time))
@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+import shutil
+import struct
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.remux import FragmentRemuxer, iter_boxes, find_box
+
+def box(box_type: str, *children: bytes) -> bytes:
+    payload = b"".join(children)
+
+    return struct.pack(">I4s", len(payload) + 8, box_type.encode()) + payload
+
+def full_box(box_type: str, version: int, payload: bytes) -> bytes:
+    return box(box_type, struct.pack(">I", version << 24), payload)
+
+def make_sample(path: str, handler: str, timescale: int, fragment_duration: int, fragment_size: int, count: int):
+    # 生成与 B 站 DASH 流结构相同的文件：ftyp、moov、sidx，之后是 count 组 moof + mdat
+    tkhd = full_box("tkhd", 0, struct.pack(">III", 0, 0, 1) + bytes(68))
+    mdhd = full_box("mdhd", 0, struct.pack(">IIII", 0, 0, timescale, 0) + bytes(4))
+    hdlr = full_box("hdlr", 0, struct.pack(">I4s", 0, handler.encode()) + bytes(13))
+
+    moov = box("moov",
+        full_box("mvhd", 0, struct.pack(">IIII", 0, 0, 1000, 0) + bytes(76) + struct.pack(">I", 2)),
+        box("trak", tkhd, box("mdia", mdhd, hdlr, box("minf"))),
+        box("mvex", full_box("trex", 0, struct.pack(">IIIII", 1, 1, 0, 0, 0)))
+    )
+
+    with open(path, "wb") as f:
+        f.write(box("ftyp", b"iso5", struct.pack(">I", 1), b"iso6mp41"))
+        f.write(moov)
+        f.write(full_box("sidx", 0, bytes(24)))
+
+        for index in range(count):
+            payload = struct.pack(">4sI", handler.encode(), index) * (fragment_size // 8)
+
+            tfhd = box("tfhd", struct.pack(">II", 0x020000, 1))
+            tfdt = full_box("tfdt", 1, struct.pack(">Q", index * fragment_duration))
+            trun = box("trun", struct.pack(">IIi", 0x000001, 1, 0))
+
+            moof = box("moof", full_box("mfhd", 0, struct.pack(">I", index + 1)), box("traf", tfhd, tfdt, trun))
+
+            # trun 的 data_offset 指向 mdat 的数据部分，相对 moof 起始位置
+            moof = moof[:-4] + struct.pack(">i", len(moof) + 8)
+
+            f.write(moof)
+            f.write(box("mdat", payload))
+
+def verify(path: str) -> int:
+    # 检查每个分段的轨道编号、序号，以及 data_offset 指向的数据是否属于对应的轨道
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+
+    moov = find_box(data, ["moov"])
+    track_ids = [struct.unpack_from(">I", data, start + header_size + 20)[0] for box_type, start, header_size, end in iter_boxes(data, moov[0] + moov[1], moov[2]) if box_type == "trak"]
+
+    assert track_ids == [1, 2], track_ids
+
+    count = 0
+
+    for box_type, start, header_size, end in iter_boxes(data, 0, len(data)):
+        if box_type != "moof":
+            continue
+
+        count += 1
+
+        mfhd = find_box(data, ["mfhd"], start + header_size, end)
+        tfhd = find_box(data, ["traf", "tfhd"], start + header_size, end)
+        trun = find_box(data, ["traf", "trun"], start + header_size, end)
+
+        assert struct.unpack_from(">I", data, mfhd[0] + mfhd[1] + 4)[0] == count
+
+        track_id = struct.unpack_from(">I", data, tfhd[0] + tfhd[1] + 4)[0]
+        data_offset = struct.unpack_from(">i", data, trun[0] + trun[1] + 8)[0]
+
+        assert data[start + data_offset:start + data_offset + 4] == (b"vide" if track_id == 1 else b"soun")
+
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "对比内置 fMP4 remuxer 与 ffmpeg -c copy 的合并耗时")
+    parser.add_argument("--video", help = "B 站 DASH 视频文件，不指定时生成测试文件")
+    parser.add_argument("--audio", help = "B 站 DASH 音频文件")
+    parser.add_argument("--size", type = int, default = 512, help = "生成的测试文件总大小 (MB)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video_path, audio_path = args.video, args.audio
+
+        if not (video_path and audio_path):
+            video_path, audio_path = os.path.join(temp_dir, "video.mp4"), os.path.join(temp_dir, "audio.m4a")
+
+            # 视频每段 2 秒，音频每段 1 秒，大小约为 9:1
+            count = max(args.size * 1024 * 1024 // (2 * 1048576 * 10 // 9), 1)
+
+            make_sample(video_path, "vide", 16000, 32000, 1048576 * 2 * 9 // 10 // 8 * 8, count)
+            make_sample(audio_path, "soun", 44100, 44100, 1048576 * 2 // 10 // 2 // 8 * 8, count * 2)
+
+        size = (os.path.getsize(video_path) + os.path.getsize(audio_path)) / 1024 / 1024
+
+        output_path = os.path.join(temp_dir, "remux.mp4")
+
+        tracemalloc.start()
+
+        start_time = time.perf_counter()
+
+        FragmentRemuxer(video_path, audio_path, output_path).run()
+
+        remux_time = time.perf_counter() - start_time
+
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        if not args.video:
+            print("fragments: {}".format(verify(output_path)))
+
+        print("remuxer: {:.2f} s, {:.1f} MB/s, peak memory {:.1f} MB".format(remux_time, size / remux_time, peak / 1024 / 1024))
+
+        ffmpeg_path = shutil.which("ffmpeg")
+
+        # 生成的测试文件不含真实的编码数据，只在指定样本文件时对比 ffmpeg
+        if ffmpeg_path and args.video:
+            start_time = time.perf_counter()
+
+            subprocess.run([ffmpeg_path, "-v", "quiet", "-y", "-i", audio_path, "-i", video_path, "-c", "copy", os.path.join(temp_dir, "ffmpeg.mp4")], check = True)
+
+            ffmpeg_time = time.perf_counter() - start_time
+
+            print("ffmpeg:  {:.2f} s, {:.1f} MB/s".format(ffmpeg_time, size / ffmpeg_time))
@@ -0,0 +1,81 @@
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在新的进程中计时，模块缓存与已导入的模块不影响结果；config.ini 从当前目录读取，每次在临时目录中运行
+import_script = """
+import sys, time
+sys.path.insert(0, {root!r})
+start_time = time.perf_counter()
+import {module}
+import_time = time.perf_counter() - start_time
+from utils.config import conf
+conf.wait_ffmpeg()
+print(import_time, time.perf_counter() - start_time)
+"""
+
+window_script = """
+import sys, time
+sys.path.insert(0, {root!r})
+start_time = time.perf_counter()
+import wx
+from gui.main import MainWindow
+app = wx.App()
+main_window = MainWindow(None)
+main_window.Show()
+window_time = time.perf_counter() - start_time
+from utils.config import conf
+conf.wait_ffmpeg()
+print(window_time, time.perf_counter() - start_time)
+"""
+
+def run(script: str, cwd: str, **kwargs) -> tuple:
+    # 返回导入或创建窗口的耗时，以及后台的 ffmpeg 检查完成时的耗时
+    process = subprocess.run([sys.executable, "-c", script.format(root = root_path, **kwargs)], cwd = cwd, stdout = subprocess.PIPE, stderr = subprocess.PIPE, text = True)
+
+    if process.returncode:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+    return tuple(float(value) for value in process.stdout.strip().splitlines()[-1].split())
+
+def measure(name: str, script: str, count: int, reset_config: bool = False, **kwargs):
+    result = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for index in range(count):
+            # 每次使用原始的配置文件时，ffmpeg 的检查结果没有缓存
+            if reset_config or not index:
+                shutil.copy(os.path.join(root_path, "config.ini"), temp_dir)
+
+            try:
+                result.append(run(script, temp_dir, **kwargs))
+
+            except RuntimeError as e:
+                print("{:<28} skipped: {}".format(name, e))
+                return
+
+    startup_time, ready_time = [statistics.median(value) * 1000 for value in zip(*result)]
+
+    print("{:<28} median {:.1f} ms, ffmpeg checked at {:.1f} ms".format(name, startup_time, ready_time))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "测量启动耗时：配置加载 (含 ffmpeg 检查)、主界面模块导入与主窗口创建")
+    parser.add_argument("-n", "--count", type = int, default = 5, help = "每项运行的次数")
+    parser.add_argument("--window", action = "store_true", help = "同时测量创建并显示主窗口的耗时，需要图形界面环境")
+    args = parser.parse_args()
+
+    print("ffmpeg: {}".format(shutil.which("ffmpeg") or "not found"))
+
+    measure("utils.config (first run)", import_script, args.count, reset_config = True, module = "utils.config")
+    measure("utils.config (cached)", import_script, args.count, module = "utils.config")
+    measure("CLI modules", import_script, args.count, module = "utils.parser, utils.task, utils.download, utils.merge")
+    measure("gui.main", import_script, args.count, module = "gui.main")
+
+    if args.window:
+        measure("MainWindow", window_script, args.count)
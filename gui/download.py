@@ -1,125 +1,25 @@
 import io
+import os
 import wx
-import json
 import wx.adv
-import requests
 import subprocess
-from typing import List
 
-from .templates import Frame, ScrolledPanel
+from .templates import Frame
 
 from utils.icons import *
 from utils.config import Config, Download, conf
 from utils.thread import Thread
-from utils.download import Downloader
+from utils.download import create_downloader, info_service
+from utils.prefetch import playurl_prefetcher
+from utils.merge import merge_queue
+from utils.task import DownloadUtils
+from utils.events import event_hub
+from utils.thumbnail import thumbnail_service
 from utils.tools import *
 
 class DownloadInfo:
     download_list = {}
 
-class DownloadUtils:
-    def __init__(self, info: dict, onError: object):
-        self.info, self.onError, self.none_audio = info, onError, False
-
-    def get_video_durl(self):
-        json_dash = self.get_video_durl_json()
-
-        self.resolution = json_dash["video"][0]["id"] if json_dash["video"][0]["id"] < self.info["resolution"] else self.info["resolution"]
-
-        temp_video_durl = [i for i in json_dash["video"] if i["id"] == self.resolution]
-
-        self.codec_id = codec_id_map[Config.Download.codec]
-
-        resp = self.has_codec(temp_video_durl, self.codec_id)
-
-        if resp["result"]:
-            self.video_durl = temp_video_durl[resp['index']]["backupUrl"][0]
-        else:
-            self.video_durl = temp_video_durl[0]["backupUrl"][0]
-            self.codec_id = 7
-        
-        
-        if json_dash["audio"]:
-            temp_audio_durl = sorted(json_dash["audio"], key = lambda x: x["id"], reverse = True)
-            self.audio_durl = [i for i in temp_audio_durl if (i["id"] - 30200) == self.resolution or (i["id"] - 30200) < self.resolution][0]["backupUrl"][0]
-
-            self.none_audio = False
-        else:
-            self.none_audio = True
-    
-    def get_video_durl_json(self):
-        try:
-            match self.info["type"]:
-                case Config.Type.VIDEO:
-                    url = f"https://api.bilibili.com/x/player/playurl?bvid={self.info['bvid']}&cid={self.info['cid']}&qn=0&fnver=0&fnval=4048&fourk=1"
-
-                    req = requests.get(url, headers = get_header(self.info["url"], Config.User.sessdata), proxies = get_proxy(), auth = get_auth())
-                    resp = json.loads(req.text)
-                        
-                    json_dash = resp["data"]["dash"]
-                case Config.Type.BANGUMI:
-                    url = f"https://api.bilibili.com/pgc/player/web/playurl?bvid={self.info['bvid']}&cid={self.info['cid']}&qn=0&fnver=0&fnval=4048&fourk=1"
-                    
-                    req = requests.get(url, headers = get_header(self.info["url"], Config.User.sessdata), proxies = get_proxy(), auth = get_auth())
-                    resp = json.loads(req.text)
-                        
-                    json_dash = resp["result"]["dash"]
-        except:
-            self.onError()
-
-        return json_dash
-
-    def get_download_info(self) -> list:
-        self.get_video_durl()
-
-        video_info = {
-            "id": self.info["id"],
-            "type": "video",
-            "url": self.video_durl,
-            "referer_url": self.info["url"],
-            "file_name": "video_{}.mp4".format(self.info["id"]),
-            "chunk_list": []
-        }
-
-        if not self.none_audio:
-            audio_info = {
-                "id": self.info["id"],
-                "type": "audio",
-                "url": self.audio_durl,
-                "referer_url": self.info["url"],
-                "file_name": "audio_{}.mp3".format(self.info["id"]),
-                "chunk_list": []
-            }
-
-        return [video_info] if self.none_audio else [video_info, audio_info]
-        
-    def merge_video(self):
-        title = get_legal_name(self.info["title"])
-
-        if self.none_audio:
-            cmd = f'''cd "{Config.Download.path}" && rename "video_{self.info['id']}.mp4" "{title}.mp4"'''
-        else:
-            cmd = f'''cd "{Config.Download.path}" && "{Config.Download.ffmpeg_path}" -v quiet -y -i audio_{self.info['id']}.mp3 -i video_{self.info['id']}.mp4 -acodec copy -vcodec copy "{title}.mp4"'''
-                
-        self.merge_process = subprocess.Popen(cmd, shell = True)
-        self.merge_process.wait()
-
-        if Config.Download.ffmpeg_available:
-            remove_files(Config.Download.path, [f"video_{self.info['id']}.mp4", f"audio_{self.info['id']}.mp3"])
-
-    def has_codec(self, video_durl: List[dict], codec_id: int):
-        for index, entry in enumerate(video_durl):
-            if entry["codecid"] == codec_id:
-                return {
-                    "result": True,
-                    "index": index
-                }
-        
-        return {
-            "result": False,
-            "index": None
-        }
-
 class DownloadWindow(Frame):
     def __init__(self, parent):
         Frame.__init__(self, parent, "下载管理", style = wx.DEFAULT_FRAME_STYLE & (~wx.MINIMIZE_BOX) & (~wx.MAXIMIZE_BOX))
@@ -156,8 +56,7 @@ class DownloadWindow(Frame):
 
         top_border = wx.StaticLine(self, -1, style = wx.LI_HORIZONTAL)
 
-        self.download_list_panel = ScrolledPanel(self, size = self.FromDIP((720, 280)))
-        self.download_list_panel.SetBackgroundColour("white")
+        self.task_listbox = DownloadListBox(self, size = self.FromDIP((720, 280)))
 
         bottom_border = wx.StaticLine(self, -1, style = wx.LI_HORIZONTAL)
 
@@ -174,7 +73,7 @@ class DownloadWindow(Frame):
         vbox.Add(self.task_lab, 0, wx.ALL, 10)
         vbox.Add(action_hbox, 0, wx.EXPAND)
         vbox.Add(top_border, 0, wx.EXPAND)
-        vbox.Add(self.download_list_panel, 1, wx.EXPAND)
+        vbox.Add(self.task_listbox, 1, wx.EXPAND)
         vbox.Add(bottom_border, 0, wx.EXPAND)
         vbox.Add(botton_hbox, 0, wx.EXPAND)
 
@@ -210,6 +109,8 @@ class DownloadWindow(Frame):
                 self.max_download_choice.Set(choices)
 
         self.max_download_choice.SetSelection(index)
+
+        wx.CallAfter(self.restore_download_item)
  
     def OnClose(self, event):
         Config.Temp.download_window_pos = self.GetPosition()
@@ -229,7 +130,7 @@ class DownloadWindow(Frame):
 
         Config.Download.max_download = index + 1
 
-        conf.config.set("download", "max_download", str(Config.Download.max_download))
+        conf.set("download", "max_download", str(Config.Download.max_download))
         conf.save()
 
         self.start_download()
@@ -253,37 +154,69 @@ class DownloadWindow(Frame):
         for callback in callback_list:
             callback(0)
 
-        self.download_list_panel.Layout()
         self.update_task_lab()
 
-    def add_download_item(self):
-        for entry in Download.download_list:
-            if self.is_already_in_list(entry["title"], entry["cid"]):
+    def restore_download_item(self):
+        # 将上次未完成的任务重新加入下载列表
+        download_list = []
+
+        for key, value in info_service.read().items():
+            entry = value["base_info"]
+            entry["status"] = "wait"
+
+            if value["thread_info"]:
+                entry["thread_info"] = value["thread_info"]
+
+            download_list.append(entry)
+
+        if download_list:
+            self.add_download_item(download_list)
+
+            self.GetParent().infobar.ShowMessage(f"提示：已恢复 {len(download_list)} 个未完成的下载任务", flags = wx.ICON_INFORMATION)
+
+    def add_download_item(self, download_list: list = None):
+        # 列表中的任务较多时，逐个比较标题与 cid 的开销较大，预先生成集合
+        key_set = {(value["title"], value["cid"]) for value in DownloadInfo.download_list.values()}
+
+        task_list = []
+
+        for entry in download_list if download_list is not None else Download.download_list:
+            if (entry["title"], entry["cid"]) in key_set:
                 continue
 
-            item = DownloadItemPanel(self.download_list_panel, entry)
+            key_set.add((entry["title"], entry["cid"]))
 
-            self.download_list_panel.sizer.Add(item, 0, wx.EXPAND)
+            task_list.append(DownloadTask(self, entry))
 
-            entry["start_callback"] = item.start
-            entry["pause_callback"] = item.onPauseCallback
-            entry["resume_callback"] = item.onResumeCallback
-            entry["stop_callback"] = item.onStop
+        # 任务记录一次写入数据库，下载器在开始下载时才创建
+        info_service.init_list([task.info for task in task_list])
+
+        for task in task_list:
+            entry = task.info
+
+            entry["start_callback"] = task.start
+            entry["pause_callback"] = task.onPauseCallback
+            entry["resume_callback"] = task.onResumeCallback
+            entry["stop_callback"] = task.onStop
 
             DownloadInfo.download_list[entry["id"]] = entry
 
-            self.download_list_panel.SetupScrolling(scroll_x = False)
-        
-        self.layout_sizer()
+            event_hub.publish("status", id = entry["id"], title = entry["title"], status = entry["status"])
+
+        # 列表只更新行数，不为每个任务创建控件
+        self.task_listbox.add_tasks(task_list)
+
+        return task_list
+
+        self.update_task_lab()
 
         self.start_download()
 
-    def layout_sizer(self):
+    def remove_task(self, task):
+        self.task_listbox.remove_task(task)
+
         self.update_task_lab()
 
-        self.download_list_panel.Layout()
-        self.download_list_panel.SetupScrolling(scroll_x = False, scrollToTop = False)
-    
     def update_task_lab(self):
         count = 0
 
@@ -298,9 +231,26 @@ class DownloadWindow(Frame):
             self.ShowNotificationToast()
 
     def start_download(self):
+        # 下载数在循环中累加，不必每个任务都重新统计
+        count = self.get_downloading_count()
+
         for key, value in DownloadInfo.download_list.items():
-            if value["status"] == "wait" and self.get_downloading_count() < Config.Download.max_download:
+            if count >= Config.Download.max_download:
+                break
+
+            if value["status"] == "wait":
                 value["start_callback"]()
+
+                count += 1
+
+        self.prefetch_download()
+
+    def prefetch_download(self):
+        # 并行获取接下来几个等待中任务的下载链接，空出下载位时可直接开始传输
+        wait_list = [value for value in DownloadInfo.download_list.values() if value["status"] == "wait"]
+
+        for info in wait_list[:Config.Download.prefetch_count]:
+            playurl_prefetcher.prefetch(info["id"], DownloadUtils(info, None).request_video_durl_json)
     
     def get_downloading_count(self):
         count = 0
@@ -319,118 +269,300 @@ class DownloadWindow(Frame):
 
             notification.Show()
 
-    def is_already_in_list(self, title, cid) -> bool:
-        for key, value in DownloadInfo.download_list.items():
-            if value["title"] == title and value["cid"] == cid:
-                return True
-            else:
-                return False
-            
-class DownloadItemPanel(wx.Panel):
-    def __init__(self, parent, info: dict):
-        self.info = info
+    def get_task_list(self) -> list:
+        # 以下方法供控制接口调用，均在 UI 线程中执行
+        return list(DownloadInfo.download_list.values())
+
+    def get_task(self, id: int) -> dict:
+        return DownloadInfo.download_list.get(id)
+
+    def add_task_list(self, download_list: list) -> list:
+        # 返回实际加入的任务，标题与 cid 相同的任务已在列表中时跳过
+        return [task.info for task in self.add_download_item(download_list)]
+
+    def run_task_callback(self, id: int, callback: str, status_list: list) -> bool:
+        entry = DownloadInfo.download_list.get(id)
+
+        if not entry:
+            return None
+
+        if entry["status"] not in status_list:
+            return False
+
+        self.run_callback_list([entry[callback]])
+
+        return True
+
+class DownloadListBox(wx.VListBox):
+    # 只绘制可见的行，任务再多也只有一个控件，进度变化时只重绘对应的行
+    def __init__(self, parent, size):
+        wx.VListBox.__init__(self, parent, -1, size = size)
+
+        self.task_list, self.index_map = [], None
 
-        wx.Panel.__init__(self, parent)
+        self.tooltip = ""
 
         self.init_UI()
 
         self.Bind_EVT()
 
-        self.init_utils()
+    def init_UI(self):
+        self.SetBackgroundColour("white")
 
-        self.CentreOnParent()
+        self.margin, self.row_height = self.FromDIP(10), self.FromDIP(95)
 
-    def init_utils(self):
-        self.downloader = Downloader(self.info, self.onStart, self.onDownload, self.onMerge)
-        self.utils = DownloadUtils(self.info, self.onError)
+        self.gray_colour = wx.Colour(108, 108, 108)
+        self.border_colour = wx.Colour(227, 227, 227)
 
-        Thread(target = self.get_preview_pic).start()
+        self.icon_map = {
+            "resume": get_resume_icon,
+            "pause": get_pause_icon,
+            "folder": get_folder_icon,
+            "delete": get_delete_icon
+        }
+
+        self.icon_map = {key: wx.Image(io.BytesIO(value())).Scale(24, 24).ConvertToBitmap() for key, value in self.icon_map.items()}
+        self.disabled_icon_map = {key: value.ConvertToDisabled() for key, value in self.icon_map.items()}
+
+        wx.Image.SetDefaultLoadFlags(0) # 避免出现 iCCP sRGB 警告
+
+        thumbnail_service.set_decoder(self.decode_thumbnail)
 
-    def init_UI(self):
-        self.preview_pic = wx.StaticBitmap(self, -1, size = (160, 75))
-
-        self.title_lab = wx.StaticText(self, -1, self.info["title"], size = self.FromDIP((300, 24)), style = wx.ST_ELLIPSIZE_MIDDLE)
-        self.title_lab.SetToolTip(self.info["title"])
-
-        self.resolution_lab = wx.StaticText(self, -1)
-        self.resolution_lab.SetForegroundColour(wx.Colour(108, 108, 108))
-        
-        self.size_lab = wx.StaticText(self, -1, "")
-        self.size_lab.SetForegroundColour(wx.Colour(108, 108, 108))
-
-        resolution_hbox = wx.BoxSizer(wx.HORIZONTAL)
-        resolution_hbox.Add(self.resolution_lab, 0, wx.ALL & (~wx.TOP), 10)
-        resolution_hbox.AddStretchSpacer()
-        resolution_hbox.Add(self.size_lab, 0, wx.ALL & (~wx.TOP), 10)
-        resolution_hbox.AddStretchSpacer()
-
-        info_vbox = wx.BoxSizer(wx.VERTICAL)
-        info_vbox.AddSpacer(5)
-        info_vbox.Add(self.title_lab, 0, wx.ALL & (~wx.BOTTOM), 10)
-        info_vbox.AddStretchSpacer()
-        info_vbox.Add(resolution_hbox, 0, wx.EXPAND)
-        info_vbox.AddSpacer(5)
-
-        self.gauge = wx.Gauge(self, -1, 100)
-
-        self.speed_lab = wx.StaticText(self, -1, "等待下载...")
-        self.speed_lab.SetForegroundColour(wx.Colour(108, 108, 108))
-
-        gauge_vbox = wx.BoxSizer(wx.VERTICAL)
-        gauge_vbox.AddSpacer(5)
-        gauge_vbox.Add(self.gauge, 0, wx.ALL | wx.EXPAND, 10)
-        gauge_vbox.AddStretchSpacer()
-        gauge_vbox.Add(self.speed_lab, 0, wx.ALL & (~wx.TOP), 10)
-        gauge_vbox.AddSpacer(5)
-
-        self.pause_btn = wx.BitmapButton(self, -1, wx.Image(io.BytesIO(get_resume_icon())).Scale(24, 24).ConvertToBitmap())
-        self.pause_btn.SetToolTip("开始下载")
-        self.stop_btn = wx.BitmapButton(self, -1, wx.Image(io.BytesIO(get_delete_icon())).Scale(24, 24).ConvertToBitmap())
-        self.stop_btn.SetToolTip("取消下载")
-
-        panel_hbox = wx.BoxSizer(wx.HORIZONTAL)
-        panel_hbox.Add(self.preview_pic, 0, wx.ALL, 10)
-        panel_hbox.Add(info_vbox, 0, wx.EXPAND)
-        panel_hbox.Add(gauge_vbox, 0, wx.EXPAND)
-        panel_hbox.AddStretchSpacer()
-        panel_hbox.Add(self.pause_btn, 0, wx.ALIGN_CENTER | wx.ALL, 10)
-        panel_hbox.Add(self.stop_btn, 0, wx.ALIGN_CENTER | wx.ALL, 10)
-        panel_hbox.AddSpacer(10)
-
-        border = wx.StaticLine(self, -1, style = wx.LI_HORIZONTAL)
-
-        self.panel_vbox = wx.BoxSizer(wx.VERTICAL)
-        self.panel_vbox.Add(panel_hbox, 1, wx.EXPAND)
-        self.panel_vbox.Add(border, 0, wx.EXPAND)
-
-        self.SetSizer(self.panel_vbox)
-    
     def Bind_EVT(self):
-        self.pause_btn.Bind(wx.EVT_BUTTON, self.onPauseBtn_EVT)
-        self.stop_btn.Bind(wx.EVT_BUTTON, self.onStop)
+        self.Bind(wx.EVT_LEFT_DOWN, self.onLeftDown)
+        self.Bind(wx.EVT_MOTION, self.onMotion)
 
-    def get_preview_pic(self):
-        req = requests.get(self.info["pic"])
+    def OnMeasureItem(self, n):
+        return self.row_height
 
-        wx.Image.SetDefaultLoadFlags(0) # 避免出现 iCCP sRGB 警告
+    def OnDrawBackground(self, dc, rect, n):
+        # 不显示选中状态
+        dc.SetBrush(wx.WHITE_BRUSH)
+        dc.SetPen(wx.TRANSPARENT_PEN)
+        dc.DrawRectangle(rect)
+
+    def OnDrawSeparator(self, dc, rect, n):
+        dc.SetPen(wx.Pen(self.border_colour))
+        dc.DrawLine(rect.GetLeft(), rect.GetBottom(), rect.GetRight(), rect.GetBottom())
+
+    def OnDrawItem(self, dc, rect, n):
+        task: DownloadTask = self.task_list[n]
+
+        # 封面在第一次显示时才获取
+        task.load_preview()
+
+        x, y, margin = rect.GetX(), rect.GetY(), self.margin
+
+        if task.preview:
+            dc.DrawBitmap(task.preview, x + margin, y + margin)
+        else:
+            dc.SetBrush(wx.Brush(self.border_colour))
+            dc.SetPen(wx.TRANSPARENT_PEN)
+            dc.DrawRectangle(x + margin, y + margin, 160, 75)
+
+        dc.SetFont(self.GetFont())
+
+        info_x = x + margin * 2 + 160
+        text_y = y + margin + self.FromDIP(5)
+        bottom_y = y + self.row_height - margin - self.FromDIP(5) - dc.GetCharHeight()
+
+        dc.SetTextForeground(self.GetForegroundColour())
+        dc.DrawText(wx.Control.Ellipsize(task.info["title"], dc, wx.ELLIPSIZE_MIDDLE, self.FromDIP(300)), info_x, text_y)
+
+        dc.SetTextForeground(self.gray_colour)
+        dc.DrawText(task.resolution_text, info_x, bottom_y)
+        dc.DrawText(task.size_text, info_x + self.FromDIP(170), bottom_y)
+
+        button_rect = self.get_button_rect(rect)
+
+        gauge_x = info_x + self.FromDIP(320)
+        gauge_width = max(button_rect["pause"].GetX() - margin * 2 - gauge_x, self.FromDIP(60))
+
+        wx.RendererNative.Get().DrawGauge(self, dc, wx.Rect(gauge_x, text_y, gauge_width, self.FromDIP(16)), task.progress, 100)
+
+        dc.SetTextForeground(wx.Colour("red") if task.error else self.gray_colour)
+        dc.DrawText(task.speed_text, gauge_x, bottom_y)
+
+        for key, value in button_rect.items():
+            icon_map = self.icon_map if task.is_enabled(key) else self.disabled_icon_map
+
+            dc.DrawBitmap(icon_map[task.get_icon(key)], value.GetX() + self.FromDIP(4), value.GetY() + self.FromDIP(4), True)
+
+    @staticmethod
+    def decode_thumbnail(data: bytes) -> wx.Image:
+        # 在缩略图线程池中执行，转换为 wx.Bitmap 需在 UI 线程中进行
+        image = wx.Image(io.BytesIO(data))
 
-        image = wx.Image(io.BytesIO(req.content)).Scale(160, 75)
-        
-        self.preview_pic.SetBitmap(image.ConvertToBitmap())
+        if image.GetSize() != (160, 75):
+            image = image.Scale(160, 75, wx.IMAGE_QUALITY_HIGH)
 
-        self.panel_vbox.Layout()
+        return image
+
+    def get_button_rect(self, rect: wx.Rect) -> dict:
+        # 按钮的点击区域比图标略大
+        size = 24 + self.FromDIP(8)
+
+        top = rect.GetY() + (self.row_height - size) // 2
+
+        stop_x = rect.GetRight() - self.margin * 2 - size
+        pause_x = stop_x - self.margin - size
+
+        return {
+            "pause": wx.Rect(pause_x, top, size, size),
+            "stop": wx.Rect(stop_x, top, size, size)
+        }
+
+    def hit_test_button(self, pos: wx.Point):
+        n = self.VirtualHitTest(pos.y)
+
+        if n == wx.NOT_FOUND or n >= len(self.task_list):
+            return None, None
+
+        for key, value in self.get_button_rect(self.GetItemRect(n)).items():
+            if value.Contains(pos):
+                return self.task_list[n], key
+
+        return self.task_list[n], None
+
+    def onLeftDown(self, event):
+        task, key = self.hit_test_button(event.GetPosition())
+
+        if key and task.is_enabled(key):
+            task.onButton(key)
+        else:
+            event.Skip()
+
+    def onMotion(self, event):
+        task, key = self.hit_test_button(event.GetPosition())
+
+        if key:
+            tooltip = task.get_tooltip(key)
+        else:
+            tooltip = task.info["title"] if task else ""
+
+        if tooltip != self.tooltip:
+            self.tooltip = tooltip
+
+            self.SetToolTip(tooltip) if tooltip else self.UnsetToolTip()
+
+        event.Skip()
+
+    def add_tasks(self, task_list: list):
+        if task_list:
+            self.task_list.extend(task_list)
+
+            self.update_count()
+
+    def remove_task(self, task):
+        self.task_list.remove(task)
+
+        self.update_count()
+
+    def update_count(self):
+        self.index_map = None
+
+        self.SetItemCount(len(self.task_list))
+
+        self.Refresh()
+
+    def refresh_task(self, task):
+        # 不在可见范围内的行无需重绘
+        if self.index_map is None:
+            self.index_map = {value: index for index, value in enumerate(self.task_list)}
+
+        index = self.index_map.get(task)
+
+        if index is not None and self.IsRowVisible(index):
+            self.RefreshRow(index)
+
+class DownloadTask:
+    # 下载列表中的一行，只保存显示所需的状态，由 DownloadListBox 绘制
+    def __init__(self, parent: DownloadWindow, info: dict):
+        self.parent, self.info = parent, info
+
+        self.downloader, self.preview = None, None
+        self.preview_loading = self.removed = self.error = False
+
+        self.utils = DownloadUtils(self.info, self.onError)
+
+        self.total_size = ""
+        self.resolution_text, self.size_text, self.speed_text = "", "", "等待下载..."
+        self.progress = 0
+
+        self.pause_enabled = True
+        self.pause_icon, self.pause_tooltip = "resume", "开始下载"
+        self.stop_tooltip = "取消下载"
+
+    def update(self, **kwargs):
+        # 只有显示的内容发生变化时才重绘
+        changed = False
+
+        for key, value in kwargs.items():
+            if getattr(self, key) != value:
+                setattr(self, key, value)
+
+                changed = True
+
+        if changed and not self.removed:
+            self.parent.task_listbox.refresh_task(self)
+
+    def get_icon(self, key: str) -> str:
+        return self.pause_icon if key == "pause" else "delete"
+
+    def get_tooltip(self, key: str) -> str:
+        return self.pause_tooltip if key == "pause" else self.stop_tooltip
+
+    def is_enabled(self, key: str) -> bool:
+        return self.pause_enabled if key == "pause" else True
+
+    def onButton(self, key: str):
+        match key:
+            case "pause":
+                self.onPauseBtn_EVT(0)
+
+            case "stop":
+                self.onStop(0)
+
+    def load_preview(self):
+        # 缩略图由 thumbnail_service 统一获取与缓存，结果分批交给 UI 线程
+        if not self.preview_loading:
+            self.preview_loading = True
+
+            thumbnail_service.request(self.info["pic"], self.set_preview)
+
+    def set_preview(self, image: wx.Image):
+        self.update(preview = image.ConvertToBitmap())
 
     def start(self):
         self.set_status("downloading")
 
+        # 下载器在开始下载时才创建，等待中的任务不占用资源
+        if not self.downloader:
+            self.downloader = create_downloader(self.info, self.onStart, self.onDownload, self.onMerge, self.onDownloadError, self.onRefresh)
+
         self.start_thread = Thread(target = self.thread_start_download)
         self.start_thread.setDaemon(True)
         self.start_thread.start()
-    
+
     def thread_start_download(self):
-        self.speed_lab.SetLabel("准备下载...")
+        wx.CallAfter(self.update, speed_text = "准备下载...")
+
+        try:
+            info_list = self.utils.get_download_info()
+
+        except Exception:
+            # 获取下载链接失败，界面状态交给 UI 线程更新
+            wx.CallAfter(self.onDownloadError)
+
+            return
+
+        # 启动时恢复的任务，从已保存的分片偏移继续下载
+        thread_info = self.info.pop("thread_info", None)
+
+        if thread_info and self.utils.get_resume_info(thread_info, info_list):
+            if self.downloader.resume(thread_info):
+                return
 
-        info_list = self.utils.get_download_info()
         self.downloader.start(info_list)
 
     def onPauseBtn_EVT(self, event):
@@ -438,7 +570,7 @@ class DownloadItemPanel(wx.Panel):
             case "wait":
                 self.start()
                 self.set_status("downloading")
-            
+
             case "downloading":
                 self.onPause()
                 self.set_status("pause")
@@ -446,40 +578,33 @@ class DownloadItemPanel(wx.Panel):
             case "pause":
                 self.onResume()
                 self.set_status("downloading")
-            
+
             case "completed":
                 self.onOpenFolder()
                 return
-        
+
         self.update_pause_btn(self.info["status"])
 
     def onStart(self):
         self.total_size = format_size(self.downloader.total_size / 1024)
 
-        self.speed_lab.SetLabel("")
-        self.size_lab.SetLabel("0 MB/{}".format(self.total_size))
-
         quality_dict = dict(map(reversed, resolution_map.items()))
         codec_dict = {7: "AVC/H.264", 12: "HEVC/H.265", 13: "AVC"}
-        
-        self.resolution_lab.SetLabel("{}      {}".format(quality_dict[self.utils.resolution], codec_dict[self.utils.codec_id]))
+
+        self.update(speed_text = "", size_text = "0 MB/{}".format(self.total_size), resolution_text = "{}      {}".format(quality_dict[self.utils.resolution], codec_dict[self.utils.codec_id]))
 
         self.update_pause_btn("downloading")
 
-        self.Layout()
+        self.utils.start_stream_merge(self.downloader)
 
     def onDownload(self, info: dict):
         if self.info["status"] == "downloading":
-            self.gauge.SetValue(info["progress"])
-            self.speed_lab.SetLabel(info["speed"])
-            self.size_lab.SetLabel(info["size"])
-
-            self.Layout()
+            self.update(progress = info["progress"], speed_text = "{}    剩余 {}".format(info["speed"], info["eta"]), size_text = info["size"])
 
     def onPause(self):
         self.downloader.onPause()
 
-        self.speed_lab.SetLabel("暂停中")
+        self.update(speed_text = "暂停中")
 
     def onPauseCallback(self, event):
         self.onPause()
@@ -490,7 +615,7 @@ class DownloadItemPanel(wx.Panel):
     def onResume(self):
         self.downloader.onResume()
 
-        self.speed_lab.SetLabel("")
+        self.update(speed_text = "")
 
     def onResumeCallback(self, event):
         self.onResume()
@@ -499,84 +624,85 @@ class DownloadItemPanel(wx.Panel):
         self.update_pause_btn("downloading")
 
     def onStop(self, event):
-        self.downloader.onStop()
+        if self.downloader:
+            self.downloader.onStop()
+        else:
+            info_service.remove(self.info["id"])
 
-        self.Hide()
+        self.utils.stop_stream_merge()
+
+        playurl_prefetcher.remove(self.info["id"])
+
+        self.removed = True
 
         DownloadInfo.download_list.pop(self.info["id"])
 
-        self.GetParent().GetParent().layout_sizer()
+        event_hub.publish("removed", id = self.info["id"])
+
+        self.parent.remove_task(self)
 
-        self.Destroy()
-    
     def onMerge(self):
-        self.size_lab.SetLabel(self.total_size)
-        self.speed_lab.SetLabel("正在合成视频...")
-        self.pause_btn.Enable(False)
+        self.update(size_text = self.total_size, speed_text = "正在合成视频...", pause_enabled = False)
 
         self.set_status("merging")
 
-        parent = self.GetParent().GetParent()
+        self.parent.update_task_lab()
+        self.parent.start_download()
 
-        parent.update_task_lab()
-        parent.start_download()
+        # 合并在独立的队列中进行，不占用下载位，也不阻塞界面
+        merge_queue.submit(self.downloader.total_size, self.utils.merge_video, self.onMergeProgress, self.onMergeComplete, self.utils.is_stream_merging())
 
-        self.utils.merge_video()
+    def onMergeProgress(self, progress: int):
+        # 合并期间任务可能已被清除
+        if not self.removed and self.info["status"] == "merging":
+            self.update(speed_text = f"正在合成视频... {progress}%")
 
-        self.onMergeComplete()
-    
-    def onMergeComplete(self):
-        self.set_status("completed")
+    def onMergeComplete(self, result: bool):
+        if self.removed:
+            return
 
-        if Config.Download.ffmpeg_available:
-            self.speed_lab.SetLabel("下载完成")
+        self.set_status("completed")
 
-            self.pause_btn.Enable(True)
+        if result:
+            self.update(speed_text = "下载完成", pause_enabled = True)
         else:
-            self.speed_lab.SetLabel("未安装 ffmpeg，合成视频失败")
-            self.speed_lab.SetForegroundColour(wx.Colour("red"))
+            self.update(speed_text = "合成视频失败" if Config.Download.ffmpeg_available else "未安装 ffmpeg，合成视频失败", error = True, pause_enabled = False)
 
-            self.pause_btn.Enable(False)
-        
         self.downloader.download_info.clear()
 
-        self.stop_btn.SetToolTip("清除记录")
-
-        self.pause_btn.SetBitmap(wx.Image(io.BytesIO(get_folder_icon())).ConvertToBitmap())
-        self.pause_btn.SetToolTip("打开所在位置")
-
-        self.gauge.SetValue(100)
+        self.update(stop_tooltip = "清除记录", pause_icon = "folder", pause_tooltip = "打开所在位置", progress = 100)
 
-        self.Layout()
+    def onRefresh(self) -> list:
+        # 下载链接失效时由下载器在工作线程中调用，使用单独的 DownloadUtils，获取失败时抛出异常计入重试次数
+        return DownloadUtils(self.info, self.onError).get_download_info()
 
     def onError(self):
-        self.set_status("error")
+        # 在工作线程中获取下载链接失败时调用，由调用方处理异常
+        raise RuntimeError("Failed to get download url")
 
-        self.speed_lab.SetLabel("下载失败")
-        self.speed_lab.SetForegroundColour("red")
-        self.stop_btn.SetToolTip("清除记录")
+    def onDownloadError(self):
+        self.set_status("error")
 
-        self.pause_btn.Enable(False)
+        self.utils.stop_stream_merge()
 
-        self.Layout()
+        self.update(speed_text = "下载失败", error = True, stop_tooltip = "清除记录", pause_enabled = False)
 
-        self.GetParent().GetParent().update_task_lab()
+        self.parent.update_task_lab()
+        self.parent.start_download()
 
-        self.start_thread.stop()
-    
     def onOpenFolder(self):
         subprocess.Popen(f"explorer /select,{Config.Download.path}\\{self.info['title']}.mp4", shell = True)
 
     def update_pause_btn(self, status: str):
         match status:
             case "downloading":
-                self.pause_btn.SetToolTip("暂停下载")
-                self.pause_btn.SetBitmap(wx.Image(io.BytesIO(get_pause_icon())).ConvertToBitmap())
+                self.update(pause_tooltip = "暂停下载", pause_icon = "pause")
 
             case "pause":
-                self.pause_btn.SetToolTip("继续下载")
-                self.pause_btn.SetBitmap(wx.Image(io.BytesIO(get_resume_icon())).ConvertToBitmap())
+                self.update(pause_tooltip = "继续下载", pause_icon = "resume")
 
     def set_status(self, status: str):
         self.info["status"] = status
-        DownloadInfo.download_list[self.info["id"]]  = self.info
\ No newline at end of file
+        DownloadInfo.download_list[self.info["id"]]  = self.info
+
+        event_hub.publish("status", id = self.info["id"], title = self.info["title"], status = status)
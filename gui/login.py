@@ -94,9 +94,9 @@ class LoginWindow(wx.Dialog):
         Config.User.uname = user_info["uname"]
         Config.User.sessdata = user_info["sessdata"]
 
-        conf.config.set("user", "login", str(int(Config.User.login)))
-        conf.config.set("user", "face", str(Config.User.face))
-        conf.config.set("user", "uname", str(Config.User.uname))
-        conf.config.set("user", "sessdata", str(Config.User.sessdata))
+        conf.set("user", "login", str(int(Config.User.login)))
+        conf.set("user", "face", str(Config.User.face))
+        conf.set("user", "uname", str(Config.User.uname))
+        conf.set("user", "sessdata", str(Config.User.sessdata))
 
         conf.save()
\ No newline at end of file
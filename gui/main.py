@@ -1,22 +1,18 @@
 import wx
-import wx.py
 from io import BytesIO
 
 from utils.config import Config, Download, conf
 from utils.video import VideoInfo, VideoParser
 from utils.bangumi import BangumiInfo, BangumiParser
 from utils.activity import ActivityInfo, ActivityParser
+from utils.parser import URLParser, ParseError
 from utils.tools import *
 from utils.thread import Thread
 from utils.login import QRLogin
 
+# 其他窗口在首次打开时才导入，加快启动速度
 from .templates import Frame, TreeListCtrl, InfoBar
-from .about import AboutWindow
 from .processing import ProcessingWindow
-from .download import DownloadWindow
-from .update import UpdateWindow
-from .login import LoginWindow
-from .settings import SettingWindow
 
 class MainWindow(Frame):
     def __init__(self, parent):
@@ -32,7 +28,9 @@ class MainWindow(Frame):
 
         self.CenterOnScreen()
 
-        self.onCheckFFmpeg()
+        ffmpeg_thread = Thread(target = self.CheckFFmpegThread)
+        ffmpeg_thread.setDaemon(True)
+        ffmpeg_thread.start()
 
         self.init_user_info()
     
@@ -175,17 +173,49 @@ class MainWindow(Frame):
         self.ID_LOGOUT = wx.NewIdRef()
         self.ID_REFRESH = wx.NewIdRef()
 
-        self.video_parser = VideoParser(self.OnError)
-        self.bangumi_parser = BangumiParser(self.OnError)
-        self.activity_parser = ActivityParser(self.OnError)
+        self.video_parser = VideoParser(self.onParseError)
+        self.bangumi_parser = BangumiParser(self.onParseError)
+        self.activity_parser = ActivityParser(self.onParseError)
 
-        self.download_window = DownloadWindow(self)
+        # 下载管理窗口在首次使用时创建，有未完成的任务时在主窗口显示后创建以恢复任务
+        self.download_window = None
 
         self.download_window_opened = False
 
         wx.CallAfter(self.AutoCheckUpdate)
 
+        wx.CallAfter(self.restore_download_window)
+
+    def get_download_window(self):
+        if not self.download_window:
+            from .download import DownloadWindow
+
+            self.download_window = DownloadWindow(self)
+
+        return self.download_window
+
+    def restore_download_window(self):
+        from utils.download import info_service
+
+        if Config.Misc.api_port or info_service.has_task():
+            self.get_download_window()
+
+        if Config.Misc.api_port:
+            self.start_control_server()
+
+    def start_control_server(self):
+        # 供其他程序通过 HTTP 添加、管理下载任务
+        from utils.api import control_server
+
+        try:
+            control_server.start(self.get_download_window())
+
+        except OSError:
+            self.infobar.ShowMessage(f"控制接口启动失败：端口 {Config.Misc.api_port} 已被占用", flags = wx.ICON_ERROR)
+
     def OnAbout(self, event):
+        from .about import AboutWindow
+
         about_window = AboutWindow(self)
         about_window.ShowModal()
 
@@ -193,45 +223,54 @@ class MainWindow(Frame):
         url = self.url_box.GetValue()
         self.clear_treelist()
 
-        self.parse_thraed = Thread(target = self.ParseThread, args = (url,))
+        # 按住 Shift 获取时跳过缓存，重新请求接口
+        bypass = wx.GetKeyState(wx.WXK_SHIFT)
+
+        self.parse_thraed = Thread(target = self.ParseThread, args = (url, bypass))
         self.parse_thraed.setDaemon(True)
         self.parse_thraed.start()
 
         self.processing_window = ProcessingWindow(self)
         self.processing_window.Show()
 
-    def ParseThread(self, url: str):
-        Download.download_list.clear()
+    def ParseThread(self, url: str, bypass: bool = False):
+        # 解析结果保存在各解析器的类属性中，与控制接口等场景中的 URLParser 共用同一把锁，避免解析过程中被覆盖或恢复
+        with URLParser.lock:
+            Download.download_list.clear()
+
+            try:
+                self.parse_url(url, bypass)
+
+            except ParseError as e:
+                wx.CallAfter(self.OnError, e.code)
+
+                return
 
+            self.OnGetFinished()
+
+    def parse_url(self, url: str, bypass: bool = False):
+        # 短链接与活动页解析出视频链接后在同一线程中继续解析
         match find_str("av|BV|ep|ss|md|b23.tv|blackboard|festival", url):
             case "av" | "BV":
-                self.video_parser.parse_url(url)
+                self.video_parser.parse_url(url, bypass)
                 self.set_video_list()
 
                 self.set_resolution_list(VideoInfo)
             case "ep" | "ss" | "md":
-                self.bangumi_parser.parse_url(url)
+                self.bangumi_parser.parse_url(url, bypass)
                 self.set_bangumi_list()
 
                 self.set_resolution_list(BangumiInfo)
             case "b23.tv":
-                new_url = process_shorklink(url)
-
-                Thread(target = self.ParseThread, args = (new_url,)).start()
-                
-                self.parse_thraed.stop()
+                self.parse_url(process_shorklink(url), bypass)
 
             case "blackboard" | "festival":
                 self.activity_parser.parse_url(url)
-                
-                Thread(target = self.ParseThread, args = (ActivityInfo.new_url,)).start()
-                
-                self.parse_thraed.stop()
 
-            case _:
-                self.OnError(100)
+                self.parse_url(ActivityInfo.new_url, bypass)
 
-        self.OnGetFinished()
+            case _:
+                raise ParseError(100)
 
     def OnGetFinished(self):
         self.processing_window.Hide()
@@ -253,6 +292,8 @@ class MainWindow(Frame):
         self.download_window.add_download_item()
 
     def onOpenDownloadMgr(self, event):
+        self.get_download_window()
+
         if not self.download_window.IsShown():
             self.download_window.Show()
 
@@ -283,16 +324,12 @@ class MainWindow(Frame):
     def set_video_list(self):        
         self.treelist.set_video_list()
 
-        count = len(self.treelist.all_list_items) - len(self.treelist.parent_items)
-        
-        self.type_lab.SetLabel("视频 (共 %d 个)" % count)
+        self.type_lab.SetLabel("视频 (共 %d 个)" % self.treelist.get_count())
     
     def set_bangumi_list(self):
         self.treelist.set_bangumi_list()
 
-        count = len(self.treelist.all_list_items) - len(self.treelist.parent_items)
-
-        self.type_lab.SetLabel("{} (共 {} 个)".format(BangumiInfo.type, count))
+        self.type_lab.SetLabel("{} (共 {} 个)".format(BangumiInfo.type, self.treelist.get_count()))
 
     def OnError(self, err_code):
         match err_code:
@@ -309,9 +346,14 @@ class MainWindow(Frame):
         self.download_btn.Enable(False)
 
         wx.CallAfter(self.SetFocus)
-        self.parse_thraed.stop()
+
+    def onParseError(self, err_code):
+        # 在解析线程中调用，结束解析流程后由 ParseThread 在 UI 线程中显示错误
+        raise ParseError(err_code)
 
     def onLogin(self, event):
+        from .login import LoginWindow
+
         login_window = LoginWindow(self)
         login_window.ShowModal()
 
@@ -336,8 +378,8 @@ class MainWindow(Frame):
         Config.User.face = user_info["face"]
         Config.User.uname = user_info["uname"]
 
-        conf.config.set("user", "face", str(Config.User.face))
-        conf.config.set("user", "uname", str(Config.User.uname))
+        conf.set("user", "face", str(Config.User.face))
+        conf.set("user", "uname", str(Config.User.uname))
 
         conf.save()
 
@@ -348,10 +390,14 @@ class MainWindow(Frame):
             self.onLogin(0)
 
     def onLoadSetting(self, event):
+        from .settings import SettingWindow
+
         setting_window = SettingWindow(self)
         setting_window.ShowModal()
 
     def onLoadShell(self, event):
+        import wx.py
+
         shell = wx.py.shell.ShellFrame(self, -1, "调试")
         
         shell.CenterOnParent()
@@ -408,6 +454,8 @@ class MainWindow(Frame):
     
         else:
             if update_json["version_code"] > Config.APP.version_code:
+                from .update import UpdateWindow
+
                 update_window = UpdateWindow(self, update_json)
                 update_window.ui_update()
                 update_window.ShowWindowModal()
@@ -416,10 +464,17 @@ class MainWindow(Frame):
                 wx.MessageDialog(self, "当前没有可用的更新", "检查更新", wx.ICON_INFORMATION).ShowModal()
 
     def ShowChangeLogResult(self, update_json):
+        from .update import UpdateWindow
+
         update_window = UpdateWindow(self, update_json)
         update_window.ui_changelog()
         update_window.ShowWindowModal()
 
+    def CheckFFmpegThread(self):
+        # 首次运行或 ffmpeg 更新后需在后台检查，完成后再提示
+        if not conf.wait_ffmpeg():
+            wx.CallAfter(self.onCheckFFmpeg)
+
     def onCheckFFmpeg(self):
         if not Config.Download.ffmpeg_available:
             dlg = wx.MessageDialog(self, "未安装 ffmpeg\n\n尚未安装 ffmpeg，无法合成视频。\n\n若您已确认安装 ffmpeg，请检查（二者其一即可）：\n1.为 ffmpeg 设置环境变量\n2.将 ffmpeg 放置到程序运行目录", "警告", wx.ICON_WARNING | wx.YES_NO)
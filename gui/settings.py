@@ -7,6 +7,7 @@ from requests.auth import HTTPProxyAuth
 from utils.config import Config, conf
 from utils.tools import *
 from utils.thread import Thread
+from utils.limiter import rate_limiter
 
 class SettingWindow(wx.Dialog):
     def __init__(self, parent):
@@ -96,6 +97,22 @@ class DownloadTab(wx.Panel):
         codec_hbox.Add(codec_lab, 0, wx.ALL | wx.ALIGN_CENTER, 10)
         codec_hbox.Add(self.codec_choice, 0, wx.ALL, 10)
 
+        speed_limit_lab = wx.StaticText(self.download_box, -1, "全局限速")
+        self.speed_limit_box = wx.SpinCtrl(self.download_box, -1, min = 0, max = 10485760, size = self.FromDIP((90, 24)))
+        speed_limit_unit_lab = wx.StaticText(self.download_box, -1, "KB/s")
+
+        task_speed_limit_lab = wx.StaticText(self.download_box, -1, "单任务限速")
+        self.task_speed_limit_box = wx.SpinCtrl(self.download_box, -1, min = 0, max = 10485760, size = self.FromDIP((90, 24)))
+        task_speed_limit_unit_lab = wx.StaticText(self.download_box, -1, "KB/s（0 表示不限速）")
+
+        speed_limit_grid = wx.FlexGridSizer(2, 3, 0, 0)
+        speed_limit_grid.Add(speed_limit_lab, 0, wx.ALL & (~wx.TOP) | wx.ALIGN_CENTER_VERTICAL, 10)
+        speed_limit_grid.Add(self.speed_limit_box, 0, wx.ALL & (~wx.TOP) & (~wx.LEFT), 10)
+        speed_limit_grid.Add(speed_limit_unit_lab, 0, wx.ALL & (~wx.TOP) & (~wx.LEFT) | wx.ALIGN_CENTER_VERTICAL, 10)
+        speed_limit_grid.Add(task_speed_limit_lab, 0, wx.ALL & (~wx.TOP) | wx.ALIGN_CENTER_VERTICAL, 10)
+        speed_limit_grid.Add(self.task_speed_limit_box, 0, wx.ALL & (~wx.TOP) & (~wx.LEFT), 10)
+        speed_limit_grid.Add(task_speed_limit_unit_lab, 0, wx.ALL & (~wx.TOP) & (~wx.LEFT) | wx.ALIGN_CENTER_VERTICAL, 10)
+
         self.show_toast_chk = wx.CheckBox(self.download_box, -1, "下载完成后弹出通知（仅下载窗口在后台时有效）")
 
         vbox = wx.BoxSizer(wx.VERTICAL)
@@ -107,6 +124,7 @@ class DownloadTab(wx.Panel):
         vbox.Add(self.max_download_slider, 0, wx.EXPAND | wx.ALL & (~wx.TOP), 10)
         vbox.Add(quality_hbox)
         vbox.Add(codec_hbox)
+        vbox.Add(speed_limit_grid)
         vbox.Add(self.show_toast_chk, 0, wx.ALL, 10)
 
         download_sbox = wx.StaticBoxSizer(self.download_box)
@@ -138,6 +156,9 @@ class DownloadTab(wx.Panel):
         
         self.show_toast_chk.SetValue(Config.Download.show_notification)
 
+        self.speed_limit_box.SetValue(Config.Download.speed_limit)
+        self.task_speed_limit_box.SetValue(Config.Download.task_speed_limit)
+
     def save(self):
         default_path = os.path.join(os.getcwd(), "download")
 
@@ -147,16 +168,24 @@ class DownloadTab(wx.Panel):
         Config.Download.resolution = list(resolution_map.values())[self.quality_choice.GetSelection()]
         Config.Download.codec = list(codec_id_map.keys())[self.codec_choice.GetSelection()]
         Config.Download.show_notification = self.show_toast_chk.GetValue()
-
-        conf.config.set("download", "path", Config.Download.path if self.path_box.GetValue() != default_path else "")
-        conf.config.set("download", "max_thread", str(Config.Download.max_thread))
-        conf.config.set("download", "max_download", str(Config.Download.max_download))
-        conf.config.set("download", "resolution", str(Config.Download.resolution))
-        conf.config.set("download", "codec", Config.Download.codec)
-        conf.config.set("download", "notification", str(int(Config.Download.show_notification)))
+        Config.Download.speed_limit = self.speed_limit_box.GetValue()
+        Config.Download.task_speed_limit = self.task_speed_limit_box.GetValue()
+
+        conf.set("download", "path", Config.Download.path if self.path_box.GetValue() != default_path else "")
+        conf.set("download", "max_thread", str(Config.Download.max_thread))
+        conf.set("download", "max_download", str(Config.Download.max_download))
+        conf.set("download", "resolution", str(Config.Download.resolution))
+        conf.set("download", "codec", Config.Download.codec)
+        conf.set("download", "notification", str(int(Config.Download.show_notification)))
+        conf.set("download", "speed_limit", str(Config.Download.speed_limit))
+        conf.set("download", "task_speed_limit", str(Config.Download.task_speed_limit))
 
         conf.save()
 
+        session_pool.reset()
+
+        rate_limiter.update()
+
     def onConfirm(self):
         self.save()
 
@@ -265,16 +294,18 @@ class ProxyTab(wx.Panel):
         Config.Proxy.uname = self.uname_box.GetValue()
         Config.Proxy.passwd = self.passwd_box.GetValue()
 
-        conf.config.set("proxy", "proxy", str(int(Config.Proxy.proxy)))
-        conf.config.set("proxy", "ip", Config.Proxy.ip)
-        conf.config.set("proxy", "port", Config.Proxy.port)
+        conf.set("proxy", "proxy", str(int(Config.Proxy.proxy)))
+        conf.set("proxy", "ip", Config.Proxy.ip)
+        conf.set("proxy", "port", Config.Proxy.port)
 
-        conf.config.set("proxy", "auth", str(int(Config.Proxy.auth)))
-        conf.config.set("proxy", "uname", Config.Proxy.uname)
-        conf.config.set("proxy", "passwd", Config.Proxy.passwd)
+        conf.set("proxy", "auth", str(int(Config.Proxy.auth)))
+        conf.set("proxy", "uname", Config.Proxy.uname)
+        conf.set("proxy", "passwd", Config.Proxy.passwd)
 
         conf.save()
 
+        session_pool.reset()
+
     def set_proxy_enable(self, enable):
         self.ip_box.Enable(enable)
         self.port_box.Enable(enable)
@@ -429,11 +460,11 @@ class MiscTab(wx.Panel):
         Config.Misc.check_update = self.check_update_chk.GetValue()
         Config.Misc.debug = self.debug_chk.GetValue()
 
-        conf.config.set("misc", "auto_select", str(int(Config.Misc.auto_select)))
-        conf.config.set("misc", "show_episodes", str(int(Config.Misc.show_episodes)))
-        conf.config.set("misc", "player_path", Config.Misc.player_path)
-        conf.config.set("misc", "check_update", str(int(Config.Misc.check_update)))
-        conf.config.set("misc", "debug", str(int(Config.Misc.debug)))
+        conf.set("misc", "auto_select", str(int(Config.Misc.auto_select)))
+        conf.set("misc", "show_episodes", str(int(Config.Misc.show_episodes)))
+        conf.set("misc", "player_path", Config.Misc.player_path)
+        conf.set("misc", "check_update", str(int(Config.Misc.check_update)))
+        conf.set("misc", "debug", str(int(Config.Misc.debug)))
 
         conf.save()
 
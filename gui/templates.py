@@ -8,6 +8,7 @@ from utils.tools import *
 from utils.config import Config, Download
 from utils.video import VideoInfo
 from utils.bangumi import BangumiInfo
+from utils.parser import format_info_entry
 
 class Frame(wx.Frame):
     def __init__(self, parent, title, style = wx.DEFAULT_FRAME_STYLE):
@@ -29,7 +30,11 @@ class TreeListCtrl(wx.dataview.TreeListCtrl):
         self.Bind(wx.dataview.EVT_TREELIST_ITEM_CHECKED, self.onCheckItem)
 
     def init_list(self):
-        self.parent_items = []
+        # 视频节点的数据为视频的 id，分节节点的数据为分节名称
+        self.episode_list, self.section_map = [], {}
+
+        # 已勾选视频的 id，勾选状态变化时更新，获取下载列表时无需遍历整个列表
+        self.checked_set = set()
 
         self.ClearColumns()
         self.DeleteAllItems()
@@ -39,57 +44,49 @@ class TreeListCtrl(wx.dataview.TreeListCtrl):
         self.AppendColumn("备注", width = self.FromDIP(50))
         self.AppendColumn("时长", width = self.FromDIP(75))
 
-    def set_list(self, list: dict):
+    def set_list(self, episode_list: list):
+        # 使用解析时生成的视频索引，节点数据为视频的 id，即在索引中的位置
         root = self.GetRootItem()
-        self.all_list_items = []
 
-        for i in list:
-            rootitem = self.AppendItem(root, i)
-            
-            self.all_list_items.append(rootitem)
+        self.episode_list = episode_list
 
-            for n in list[i]:
-                childitem = self.AppendItem(rootitem, n[0])
+        section_list = {}
 
-                if Config.Misc.auto_select:
-                    self.CheckItem(childitem, state = wx.CHK_CHECKED)
+        for entry in episode_list:
+            section_list.setdefault(entry["section"], []).append(entry)
 
-                self.all_list_items.append(childitem)
+        # 冻结后批量添加，全部添加完成后只重绘一次
+        self.Freeze()
 
-                for i in [1, 2, 3]:
-                    self.SetItemText(childitem, i, n[i])
+        try:
+            for key, value in section_list.items():
+                rootitem = self.AppendItem(root, key, data = key)
 
-            if Config.Misc.auto_select:
-                self.CheckItem(rootitem, state = wx.CHK_CHECKED)
-                
-            self.Expand(rootitem)
+                for entry in value:
+                    childitem = self.AppendItem(rootitem, str(entry["index"]), data = entry["id"])
 
-    def set_video_list(self):
-        video_list = {}
-        
-        if VideoInfo.type == 3:
-            for key, value in VideoInfo.sections.items():
-                video_list[key] = [[str(index + 1), episode["arc"]["title"], "", format_duration(episode["arc"]["duration"])] for index, episode in enumerate(value)]
+                    self.SetItemText(childitem, 1, entry["title"])
+                    self.SetItemText(childitem, 2, entry["badge"])
+                    self.SetItemText(childitem, 3, format_duration(entry["duration"]))
 
-                self.parent_items.append(key)
-        else:
-            self.parent_items.append("视频")
-            video_list["视频"] = [[str(index + 1), episode["part"] if VideoInfo.type == 2 else VideoInfo.title, "", format_duration(episode["duration"])] for index, episode in enumerate(VideoInfo.pages)]
+                self.section_map[key] = [entry["id"] for entry in value]
 
-        self.set_list(video_list)
-    
-    def set_bangumi_list(self):
-        bangumi_list = {}
+                if Config.Misc.auto_select:
+                    # 勾选分节时一并勾选其中的全部视频
+                    self.CheckItemRecursively(rootitem, state = wx.CHK_CHECKED)
 
-        for key, value in BangumiInfo.sections.items():
-            if Config.Misc.show_episodes != 2 and key != "正片":
-                continue
+                    self.checked_set.update(self.section_map[key])
 
-            bangumi_list[key] = [[str(index + 1), format_bangumi_title(episode), episode["badge"], format_duration(episode["duration"], bangumi = True)] for index, episode in enumerate(value)]
+                self.Expand(rootitem)
 
-            self.parent_items.append(key)
+        finally:
+            self.Thaw()
 
-        self.set_list(bangumi_list)
+    def set_video_list(self):
+        self.set_list(VideoInfo.episode_list)
+    
+    def set_bangumi_list(self):
+        self.set_list(BangumiInfo.episode_list)
 
     def onCheckItem(self, event):
         item = event.GetItem()
@@ -97,69 +94,39 @@ class TreeListCtrl(wx.dataview.TreeListCtrl):
         self.UpdateItemParentStateRecursively(item)
 
         if self.GetFirstChild(item).IsOk():
-            self.CheckItemRecursively(item, state = wx.CHK_UNCHECKED if event.GetOldCheckedState() else wx.CHK_CHECKED)
+            state = wx.CHK_UNCHECKED if event.GetOldCheckedState() else wx.CHK_CHECKED
+
+            self.CheckItemRecursively(item, state = state)
+
+            id_list = self.section_map[self.GetItemData(item)]
+        else:
+            state = self.GetCheckedState(item)
+
+            id_list = [self.GetItemData(item)]
+
+        if state == wx.CHK_CHECKED:
+            self.checked_set.update(id_list)
+        else:
+            self.checked_set.difference_update(id_list)
+
+    def get_count(self) -> int:
+        return len(self.episode_list)
     
     def get_all_selected_item(self, resolution: int = None):
-        self.resolution = resolution
         Download.download_list.clear()
-        
-        for i in self.all_list_items:
-            text = self.GetItemText(i, 0)
-            state = bool(self.GetCheckedState(i))
-            
-            if text not in self.parent_items and state:
-                item_title = self.GetItemText(i, 1)
-                parent = self.GetItemText(self.GetItemParent(i), 0)
-                
-                if Download.current_type == VideoInfo:
-                    self.get_video_download_info(item_title, parent, int(text))
-                elif Download.current_type == BangumiInfo:
-                    self.get_bangumi_download_info(item_title, parent, int(text))
-    
-    def get_video_download_info(self, item_title: str, parent: str, index: int):
-        if VideoInfo.type == 3:
-            index = [index for index, value in enumerate(VideoInfo.sections[parent]) if value["arc"]["title"] == item_title][0]
 
-            info_entry = VideoInfo.sections[parent][index]
+        info = Download.current_type
 
-            title = info_entry["arc"]["title"]
-            pic = info_entry["arc"]["pic"]
-            bvid = info_entry["bvid"]
-            cid = info_entry["cid"]
+        if info not in (VideoInfo, BangumiInfo):
+            return
 
-        else:
-            info_entry = VideoInfo.pages[index - 1]
+        type = Config.Type.VIDEO if info == VideoInfo else Config.Type.BANGUMI
 
-            title = info_entry["part"] if VideoInfo.type == 2 else VideoInfo.title
-            pic = info_entry["first_frame"] if "first_frame" in info_entry else VideoInfo.cover
-            bvid = VideoInfo.bvid
-            cid = info_entry["cid"]
+        # 按列表中的顺序加入下载，只需处理已勾选的视频
+        for id in sorted(self.checked_set):
+            entry = self.episode_list[id]
 
-        Download.download_list.append(self.format_info_entry(Config.Type.VIDEO, title, pic, bvid, cid))
-    
-    def get_bangumi_download_info(self, item_title: str, parent: str, index: int):
-        info_entry = BangumiInfo.sections[parent][index - 1]
-
-        title = info_entry["share_copy"] if BangumiInfo.type != "电影" else format_bangumi_title(info_entry)
-        pic = info_entry["cover"]
-        bvid = info_entry["bvid"]
-        cid = info_entry["cid"]
-
-        Download.download_list.append(self.format_info_entry(Config.Type.BANGUMI, title, pic, bvid, cid))
-
-    def format_info_entry(self, type: int, title: str, pic: str, bvid: str = None, cid: str = None):
-        return {
-            "id": get_new_id(),
-            "url": VideoInfo.url if Download.current_type == VideoInfo else BangumiInfo.url,
-            "type": type,
-            "bvid": bvid,
-            "cid": cid,
-            "title": get_legal_name(title),
-            "pic": pic,
-            "size": None,
-            "status": "wait",
-            "resolution": self.resolution if self.resolution else None,
-        }
+            Download.download_list.append(format_info_entry(type, info.url, entry["title"], entry["pic"], entry["bvid"], entry["cid"], resolution))
 
 class ScrolledPanel(_ScrolledPanel):
     def __init__(self, parent, size):
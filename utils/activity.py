@@ -1,5 +1,3 @@
-import requests
-
 from .tools import *
 
 class ActivityInfo:
@@ -20,7 +18,7 @@ class ActivityParser:
     def get_initial_state(self, url):
         # 活动页链接不会包含 BV 号，ep 号等关键信息，故采用网页解析方式获取视频数据
 
-        req = requests.get(url, headers = get_header(), proxies = get_proxy(), auth = get_auth())
+        req = session_pool.get(url, headers = get_header())
 
         initial_state = re.findall(r"window.__initialState = (.*?);", req.text)
 
@@ -0,0 +1,296 @@
+import hmac
+import json
+import queue
+import secrets
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from .config import Config, conf
+from .events import event_hub
+from .dispatch import call_wait
+from .parser import URLParser
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if not self.check_token():
+            return
+
+        path, query = self.get_path()
+
+        match path:
+            case ["tasks"]:
+                try:
+                    self.send_json(200, self.server.control.list_tasks(query.get("status"), int(query.get("offset", 0)), int(query.get("limit", 100))))
+                except ValueError:
+                    self.send_json(400, {"error": "invalid offset or limit"})
+
+            case ["tasks", id]:
+                task = self.server.control.get_task(id)
+
+                self.send_json(200, task) if task else self.send_json(404, {"error": "task not found"})
+
+            case ["stats"]:
+                self.send_json(200, self.server.control.get_stats())
+
+            case ["events"]:
+                self.send_events()
+
+            case _:
+                self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self.check_token():
+            return
+
+        path, query = self.get_path()
+
+        match path:
+            case ["tasks"]:
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                except ValueError:
+                    self.send_json(400, {"error": "invalid json"})
+                    return
+
+                urls = body.get("urls") or ([body["url"]] if body.get("url") else [])
+
+                if not urls:
+                    self.send_json(400, {"error": "url or urls is required"})
+                    return
+
+                self.send_json(202, self.server.control.add_tasks(urls, body.get("resolution")))
+
+            case ["tasks", id, action]:
+                self.run_action(id, action)
+
+            case _:
+                self.send_json(404, {"error": "not found"})
+
+    def do_DELETE(self):
+        if not self.check_token():
+            return
+
+        path, query = self.get_path()
+
+        match path:
+            case ["tasks", id]:
+                self.run_action(id, "cancel")
+
+            case _:
+                self.send_json(404, {"error": "not found"})
+
+    def run_action(self, id: str, action: str):
+        if action not in ControlServer.action_map:
+            self.send_json(404, {"error": "not found"})
+            return
+
+        match self.server.control.run_action(id, action):
+            case None:
+                self.send_json(404, {"error": "task not found"})
+
+            case False:
+                self.send_json(409, {"error": f"cannot {action} task in current status"})
+
+            case True:
+                self.send_json(202, {"id": int(id), "action": action})
+
+    def send_events(self):
+        # Server-Sent Events，连接期间持续推送状态与进度变化，客户端断开后退出
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        self.close_connection = True
+
+        # 客户端读取过慢时丢弃新事件，不阻塞发布事件的下载与界面线程
+        events = queue.Queue(maxsize = 1024)
+
+        def put(data: dict):
+            try:
+                events.put_nowait(data)
+            except queue.Full:
+                pass
+
+        event_hub.subscribe(put)
+
+        try:
+            while True:
+                try:
+                    data = events.get(timeout = 15)
+
+                    self.wfile.write("event: {}\ndata: {}\n\n".format(data["event"], json.dumps(data, ensure_ascii = False)).encode("utf-8"))
+
+                except queue.Empty:
+                    # 定期发送注释行，及时发现已断开的连接
+                    self.wfile.write(b": keep-alive\n\n")
+
+                self.wfile.flush()
+
+        except OSError:
+            pass
+
+        finally:
+            event_hub.unsubscribe(put)
+
+    def check_token(self) -> bool:
+        # 所有请求均需在 Authorization 请求头中携带 config.ini 中的 api_token，避免其他程序或网页随意添加、取消任务
+        scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+
+        if scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode("utf-8"), Config.Misc.api_token.encode("utf-8")):
+            return True
+
+        # 未读取的请求体会被当作下一个请求，直接关闭连接
+        self.close_connection = True
+
+        self.send_json(401, {"error": "invalid or missing token"}, {"WWW-Authenticate": "Bearer", "Connection": "close"})
+
+        return False
+
+    def get_path(self):
+        url = urlparse(self.path)
+
+        return [part for part in url.path.split("/") if part], {key: value[0] for key, value in parse_qs(url.query).items()}
+
+    def send_json(self, status: int, data: dict, headers: dict = None):
+        body = json.dumps(data, ensure_ascii = False).encode("utf-8")
+
+        self.send_response(status)
+
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class ControlServer:
+    # 操作名称对应任务中的回调，及允许执行该操作的状态
+    action_map = {
+        "pause": ("pause_callback", ["downloading"]),
+        "resume": ("resume_callback", ["pause"]),
+        "cancel": ("stop_callback", ["wait", "downloading", "pause", "completed", "error"])
+    }
+
+    task_keys = ["id", "title", "status", "type", "bvid", "cid", "resolution"]
+
+    def __init__(self):
+        self.server = self.controller = None
+
+        # 每个任务最近一次的进度，任务列表中直接读取，无需访问下载器
+        self.progress = {}
+
+    def start(self, controller):
+        # controller 为下载管理窗口，提供 get_task_list、get_task、add_task_list 与 run_task_callback，均在 UI 线程中调用
+        self.controller = controller
+
+        # 首次启动时生成 token 并保存到配置文件中，其他程序从配置文件中读取
+        if not Config.Misc.api_token:
+            Config.Misc.api_token = secrets.token_urlsafe(24)
+
+            conf.set("misc", "api_token", Config.Misc.api_token)
+            conf.save()
+
+        self.server = ThreadingHTTPServer((Config.Misc.api_host, Config.Misc.api_port), ControlRequestHandler)
+        self.server.daemon_threads = True
+        self.server.control = self
+
+        event_hub.subscribe(self.onEvent)
+
+        threading.Thread(target = self.server.serve_forever, name = "ControlServerThread", daemon = True).start()
+
+    def onEvent(self, data: dict):
+        match data["event"]:
+            case "progress":
+                self.progress[data["id"]] = {key: data[key] for key in ("completed_size", "total_size", "speed")}
+
+            case "removed":
+                self.progress.pop(data["id"], None)
+
+    def list_tasks(self, status: str = None, offset: int = 0, limit: int = 100) -> dict:
+        # 先过滤、分页，只格式化当前页的任务，任务数量较多时每次请求的开销仍然很小
+        task_list = call_wait(self.controller.get_task_list)
+
+        if status:
+            status_list = status.split(",")
+
+            task_list = [entry for entry in task_list if entry["status"] in status_list]
+
+        return {
+            "total": len(task_list),
+            "offset": offset,
+            "tasks": [self.format_task(entry) for entry in task_list[offset:offset + limit]]
+        }
+
+    def get_task(self, id: str) -> dict:
+        entry = self.find_task(id)
+
+        return self.format_task(entry) if entry else None
+
+    def get_stats(self) -> dict:
+        count, speed = {}, 0
+
+        for entry in call_wait(self.controller.get_task_list):
+            count[entry["status"]] = count.get(entry["status"], 0) + 1
+
+            # 已暂停或已完成的任务保留着最后一次的速度，不计入总速度
+            if entry["status"] == "downloading" and entry["id"] in self.progress:
+                speed += self.progress[entry["id"]]["speed"]
+
+        return {
+            "count": count,
+            "max_download": Config.Download.max_download,
+            "speed": speed
+        }
+
+    def add_tasks(self, urls: list, resolution: int = None) -> dict:
+        # 解析在请求线程中进行，只有加入下载列表时才切换到 UI 线程
+        parser, task_list, error_list = URLParser(), [], []
+
+        for url in urls:
+            try:
+                task_list.extend(parser.parse(url, resolution))
+
+            except Exception as e:
+                error_list.append({"url": url, "error": str(e)})
+
+        if task_list:
+            # 一次加入大量任务时 UI 线程需要更长时间，等待时间随任务数增加
+            task_list = call_wait(self.controller.add_task_list, task_list, timeout = 10 + len(task_list) / 100)
+
+        return {
+            "tasks": [{"id": entry["id"], "title": entry["title"]} for entry in task_list],
+            "errors": error_list
+        }
+
+    def run_action(self, id: str, action: str):
+        # 返回 None 表示任务不存在，False 表示当前状态下不能执行该操作
+        callback, status_list = self.action_map[action]
+
+        if not id.isdigit():
+            return None
+
+        return call_wait(self.controller.run_task_callback, int(id), callback, status_list)
+
+    def find_task(self, id: str) -> dict:
+        if not id.isdigit():
+            return None
+
+        return call_wait(self.controller.get_task, int(id))
+
+    def format_task(self, entry: dict) -> dict:
+        task = {key: entry.get(key) for key in self.task_keys}
+        task["progress"] = self.progress.get(entry["id"])
+
+        return task
+
+control_server = ControlServer()
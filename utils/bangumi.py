@@ -1,9 +1,8 @@
 import re
-import json
-import requests
 
 from .tools import *
 from .config import Config
+from .cache import api_cache
 
 class BangumiInfo:
     url = bvid = epid = cid = season_id = mid = None
@@ -12,13 +11,13 @@ class BangumiInfo:
 
     payment = False
 
-    episodes = resolution_id = resolution_desc = []
+    episodes = episode_list = resolution_id = resolution_desc = []
 
     sections = {}
 
 class BangumiParser:
     def __init__(self, onError):
-        self.onError = onError
+        self.onError, self.bypass = onError, False
     
     def get_epid(self, url):
         epid = re.findall(r"ep([0-9]+)", url)
@@ -39,8 +38,7 @@ class BangumiParser:
         
         if not mid: self.onError(101)
 
-        req = requests.get(f"https://api.bilibili.com/pgc/review/user?media_id={mid[0]}", headers = get_header(), proxies = get_proxy(), auth = get_auth())
-        resp = json.loads(req.text)
+        resp = api_cache.get(f"https://api.bilibili.com/pgc/review/user?media_id={mid[0]}", self.bypass, headers = get_header())
 
         self.check_json(resp, 101)
 
@@ -50,8 +48,7 @@ class BangumiParser:
     def get_bangumi_info(self):
         url = f"https://api.bilibili.com/pgc/view/web/season?{self.argument}={self.value}"
 
-        req = requests.get(url, headers = get_header(), proxies = get_proxy(), auth = get_auth(), timeout = 8)
-        resp = json.loads(req.text)
+        resp = api_cache.get(url, self.bypass, headers = get_header(), timeout = 8)
 
         self.check_json(resp, 101)
         
@@ -64,6 +61,9 @@ class BangumiParser:
         
         BangumiInfo.episodes = info_result["episodes"]
 
+        # 连续解析多个链接时，清除上一部剧集的其他章节
+        BangumiInfo.sections.clear()
+
         if Config.Misc.show_episodes == 0:
             match self.argument:
                 case "ep_id":
@@ -92,6 +92,14 @@ class BangumiParser:
 
         self.get_bangumi_type(info_result["type"])
 
+        self.get_episode_list()
+
+    def get_episode_list(self):
+        # 标题与剧集类型有关，需在获取类型之后生成
+        episodes = [(key, index + 1, format_bangumi_title(episode), episode["cover"], episode["bvid"], episode["cid"], episode["duration"] / 1000, episode["badge"]) for key, value in BangumiInfo.sections.items() for index, episode in enumerate(value)]
+
+        BangumiInfo.episode_list = [format_episode_entry(id, *episode) for id, episode in enumerate(episodes)]
+
     def get_bangumi_type(self, type_id):
         match type_id:
             case 1:
@@ -110,8 +118,7 @@ class BangumiParser:
     def get_bangumi_resolution(self):
         url = f"https://api.bilibili.com/pgc/player/web/playurl?bvid={BangumiInfo.bvid}&cid={BangumiInfo.cid}&qn=0&fnver=0&fnval=4048&fourk=1"
 
-        req = requests.get(url, headers = get_header(BangumiInfo.url, Config.User.sessdata), proxies = get_proxy(), auth = get_auth(), timeout = 8)
-        resp = json.loads(req.text)
+        resp = api_cache.get(url, self.bypass, headers = get_header(BangumiInfo.url, Config.User.sessdata), timeout = 8)
 
         self.check_json(resp, 102)
         
@@ -120,7 +127,9 @@ class BangumiParser:
         BangumiInfo.resolution_id = json_data["accept_quality"]
         BangumiInfo.resolution_desc = json_data["accept_description"]
 
-    def parse_url(self, url):
+    def parse_url(self, url, bypass = False):
+        self.bypass = bypass
+
         if "ep" in url:
             self.get_epid(url)
         elif "ss" in url:
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from .config import Config
+from .session import session_pool
+
+class ResponseCache:
+    # 各接口的缓存时间，单位为秒，未列出的接口不缓存
+    ttl_map = {
+        "/x/web-interface/view": 600,
+        "/x/player/playurl": 300,
+        "/pgc/view/web/season": 600,
+        "/pgc/player/web/playurl": 300,
+        "/pgc/review/user": 86400
+    }
+
+    def __init__(self, max_entries: int = 128, max_size: int = 33554432):
+        self.max_entries, self.max_size = max_entries, max_size
+
+        self.path = os.path.join(os.getcwd(), "cache.db")
+
+        self.lock = threading.Lock()
+
+        self.db = None
+        self.memory = OrderedDict()
+
+        # 命中时只在内存中记录访问时间，写入新记录、需要按访问时间淘汰时再一次写入数据库
+        self.access = {}
+
+    def load(self):
+        if self.db:
+            return
+
+        self.db = sqlite3.connect(self.path, check_same_thread = False)
+
+        self.db.execute("PRAGMA journal_mode = WAL")
+
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS response (key TEXT PRIMARY KEY, text TEXT NOT NULL, expires REAL NOT NULL, size INTEGER NOT NULL, access REAL NOT NULL)")
+
+    def get(self, url: str, bypass: bool = False, **kwargs) -> dict:
+        # 返回解析后的 json，每次都重新解析，调用方可以随意修改
+        ttl, key = self.ttl_map.get(urlparse(url).path), self.get_key(url)
+
+        if ttl and not bypass:
+            text = self.lookup(key)
+
+            if text:
+                return json.loads(text)
+
+        req = session_pool.get(url, **kwargs)
+        resp = json.loads(req.text)
+
+        # 只缓存成功的响应，-412 等错误需要在下次解析时重新请求
+        if ttl and resp.get("code") == 0:
+            self.store(key, req.text, ttl)
+
+        return resp
+
+    def lookup(self, key: str) -> str:
+        with self.lock:
+            entry = self.memory.get(key)
+
+            if not entry:
+                self.load()
+
+                entry = self.db.execute("SELECT text, expires FROM response WHERE key = ?", (key,)).fetchone()
+
+                if not entry:
+                    return None
+
+            text, expires = entry
+
+            if expires < time.time():
+                self.remove(key)
+
+                return None
+
+            self.update_memory(key, entry)
+
+            self.access[key] = time.time()
+
+            return text
+
+    def store(self, key: str, text: str, ttl: int):
+        with self.lock:
+            self.load()
+
+            entry = (text, time.time() + ttl)
+
+            self.update_memory(key, entry)
+
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO response (key, text, expires, size, access) VALUES (?, ?, ?, ?, ?)", (key, text, entry[1], len(text), time.time()))
+
+                self.access.pop(key, None)
+
+                self.flush_access()
+
+                self.evict()
+
+    def flush_access(self):
+        if self.access:
+            self.db.executemany("UPDATE response SET access = ? WHERE key = ?", [(access, key) for key, access in self.access.items()])
+
+            self.access.clear()
+
+    def update_memory(self, key: str, entry: tuple):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last = False)
+
+    def evict(self):
+        # 先清理过期的记录，仍超出大小限制时按最近访问时间淘汰
+        self.db.execute("DELETE FROM response WHERE expires < ?", (time.time(),))
+
+        total_size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM response").fetchone()[0]
+
+        for key, size in self.db.execute("SELECT key, size FROM response ORDER BY access").fetchall():
+            if total_size <= self.max_size:
+                break
+
+            self.remove(key)
+
+            total_size -= size
+
+    def remove(self, key: str):
+        self.memory.pop(key, None)
+        self.access.pop(key, None)
+
+        with self.db:
+            self.db.execute("DELETE FROM response WHERE key = ?", (key,))
+
+    def clear(self):
+        with self.lock:
+            self.load()
+
+            self.memory.clear()
+            self.access.clear()
+
+            with self.db:
+                self.db.execute("DELETE FROM response")
+
+    def get_key(self, url: str) -> str:
+        # 登录状态不同时返回的清晰度列表不同，键中包含用户信息，以哈希形式保存
+        return hashlib.sha1(f"{url}|{Config.User.sessdata}".encode("utf-8")).hexdigest()
+
+api_cache = ResponseCache()
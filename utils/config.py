@@ -1,4 +1,6 @@
 import os
+import shutil
+import threading
 import subprocess
 from configparser import RawConfigParser
 
@@ -27,8 +29,13 @@ class Config:
 
         player_path = None
 
+        api_host = "127.0.0.1"
+        api_port = 0
+        api_token = ""
+
     class Download:
         path = None
+        temp_path = None
         ffmpeg_path = None
         ffmpeg_available = False
         
@@ -38,6 +45,27 @@ class Config:
         max_thread = 4
         max_download = 1
 
+        engine = "thread"
+
+        chunk_size = 1048576
+        buffer_size = 4194304
+        min_segment_size = 2097152
+
+        save_interval = 3
+
+        speed_limit = task_speed_limit = 0
+        speed_limit_schedule = ""
+
+        mirror_min_speed = 512
+
+        max_retry = 5
+
+        prefetch_count = 5
+
+        stream_merge = True
+
+        merge_thread = 0
+
         show_notification = False
 
     class Type:
@@ -58,6 +86,10 @@ class ConfigUtils:
         self.config = RawConfigParser()
         self.config.read(self.path, encoding = "utf-8")
 
+        self.lock = threading.Lock()
+
+        self.ffmpeg_thread = None
+
         self.load_config()
         self.create_download_dir()
 
@@ -68,11 +100,25 @@ class ConfigUtils:
 
         # download
         Config.Download.path = download_path if download_path else os.path.join(os.getcwd(), "download")
+        Config.Download.temp_path = self.config.get("download", "temp_path", fallback = "")
         Config.Download.max_download = self.config.getint("download", "max_download")
         Config.Download.max_thread = self.config.getint("download", "max_thread")
         Config.Download.resolution = self.config.getint("download", "resolution")
         Config.Download.codec = self.config.get("download", "codec")
         Config.Download.show_notification = self.config.getint("download", "notification")
+        Config.Download.engine = self.config.get("download", "engine", fallback = "thread")
+        Config.Download.chunk_size = self.config.getint("download", "chunk_size", fallback = 1) * 1024 * 1024
+        Config.Download.buffer_size = self.config.getint("download", "buffer_size", fallback = 4) * 1024 * 1024
+        Config.Download.min_segment_size = self.config.getint("download", "min_segment_size", fallback = 2) * 1024 * 1024
+        Config.Download.save_interval = self.config.getint("download", "save_interval", fallback = 3)
+        Config.Download.speed_limit = self.config.getint("download", "speed_limit", fallback = 0)
+        Config.Download.task_speed_limit = self.config.getint("download", "task_speed_limit", fallback = 0)
+        Config.Download.speed_limit_schedule = self.config.get("download", "speed_limit_schedule", fallback = "")
+        Config.Download.mirror_min_speed = self.config.getint("download", "mirror_min_speed", fallback = 512)
+        Config.Download.max_retry = self.config.getint("download", "max_retry", fallback = 5)
+        Config.Download.prefetch_count = self.config.getint("download", "prefetch_count", fallback = 5)
+        Config.Download.stream_merge = self.config.getboolean("download", "stream_merge", fallback = True)
+        Config.Download.merge_thread = self.config.getint("download", "merge_thread", fallback = 0)
 
         # user
         Config.User.login = self.config.getboolean("user", "login")
@@ -95,26 +141,75 @@ class ConfigUtils:
         Config.Misc.player_path = self.config.get("misc", "player_path")
         Config.Misc.check_update = self.config.getboolean("misc", "check_update")
         Config.Misc.debug = self.config.getboolean("misc", "debug")
+        Config.Misc.api_host = self.config.get("misc", "api_host", fallback = "127.0.0.1")
+        Config.Misc.api_port = self.config.getint("misc", "api_port", fallback = 0)
+        Config.Misc.api_token = self.config.get("misc", "api_token", fallback = "")
 
     def create_download_dir(self):
-        if not os.path.exists(Config.Download.path):
-            os.makedirs(Config.Download.path)
+        for path in filter(None, [Config.Download.path, Config.Download.temp_path]):
+            if not os.path.exists(path):
+                os.makedirs(path)
     
     def get_ffmpeg_path(self):
         local_path = os.path.join(os.getcwd(), "ffmpeg.exe")
 
-        path = local_path if os.path.exists(local_path) else "ffmpeg"
+        path = local_path if os.path.exists(local_path) else shutil.which("ffmpeg")
 
-        Config.Download.ffmpeg_path = path
+        Config.Download.ffmpeg_path = path or "ffmpeg"
 
-        process = subprocess.Popen(f'"{path}" -version', shell = True, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+        # 找不到可执行文件时无需启动进程检查，直接启动 ffmpeg 而不经过 shell
+        if not path:
+            Config.Download.ffmpeg_available = False
+            return
 
-        process.wait()
+        # 路径与修改时间均未变化时沿用上次的检查结果，否则在后台检查，不阻塞启动
+        mtime = str(os.stat(path).st_mtime_ns)
+
+        if self.config.get("ffmpeg", "path", fallback = "") == path and self.config.get("ffmpeg", "mtime", fallback = "") == mtime:
+            Config.Download.ffmpeg_available = self.config.getboolean("ffmpeg", "available", fallback = False)
+            return
+
+        self.ffmpeg_thread = threading.Thread(target = self.check_ffmpeg, args = (path, mtime), name = "FFmpegCheckThread", daemon = True)
+        self.ffmpeg_thread.start()
+
+    def check_ffmpeg(self, path: str, mtime: str):
+        try:
+            process = subprocess.run([path, "-version"], stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, creationflags = getattr(subprocess, "CREATE_NO_WINDOW", 0))
+
+            Config.Download.ffmpeg_available = b"ffmpeg version" in process.stdout
+
+        except OSError:
+            Config.Download.ffmpeg_available = False
+
+        # 检查结果首次保存时创建 [ffmpeg] 节
+        self.set("ffmpeg", "path", path)
+        self.set("ffmpeg", "mtime", mtime)
+        self.set("ffmpeg", "available", str(int(Config.Download.ffmpeg_available)))
+
+        self.save()
+
+    def wait_ffmpeg(self) -> bool:
+        # 需要使用 ffmpeg 前调用，后台检查尚未完成时等待其结束
+        if self.ffmpeg_thread:
+            self.ffmpeg_thread.join()
+
+        return Config.Download.ffmpeg_available
+
+    def is_ffmpeg_ready(self) -> bool:
+        # 不等待，后台检查尚未完成时返回 False
+        return not (self.ffmpeg_thread and self.ffmpeg_thread.is_alive())
+
+    def set(self, section: str, key: str, value: str):
+        # 后台检查 ffmpeg 后也会修改并保存配置，修改与写入均需持有锁
+        with self.lock:
+            if not self.config.has_section(section):
+                self.config.add_section(section)
+
+            self.config.set(section, key, value)
 
-        Config.Download.ffmpeg_available = True if "ffmpeg version" in str(process.stdout.read()) else False
-    
     def save(self):
-        with open(self.path, "w", encoding = "utf-8") as f:
-            self.config.write(f)
+        with self.lock:
+            with open(self.path, "w", encoding = "utf-8") as f:
+                self.config.write(f)
     
 conf = ConfigUtils()
\ No newline at end of file
@@ -0,0 +1,41 @@
+import threading
+
+class Dispatcher:
+    # 图形界面启动时设置为 wx.CallAfter，回调在 UI 线程中执行；无界面运行时直接在当前线程中调用
+    handler = None
+
+def set_handler(handler):
+    Dispatcher.handler = handler
+
+def call_after(callback, *args, **kwargs):
+    if Dispatcher.handler:
+        Dispatcher.handler(callback, *args, **kwargs)
+    else:
+        callback(*args, **kwargs)
+
+def call_wait(callback, *args, timeout: float = 10):
+    # 在 UI 线程中执行并等待返回值，供其他线程读取或修改界面中的状态
+    if not Dispatcher.handler:
+        return callback(*args)
+
+    event, result = threading.Event(), {}
+
+    def run():
+        try:
+            result["value"] = callback(*args)
+
+        except Exception as e:
+            result["error"] = e
+
+        finally:
+            event.set()
+
+    Dispatcher.handler(run)
+
+    if not event.wait(timeout):
+        raise TimeoutError("UI thread did not respond")
+
+    if "error" in result:
+        raise result["error"]
+
+    return result["value"]
@@ -1,152 +1,443 @@
 import os
-import wx
 import time
 import json
-import requests
+import random
+import atexit
+import sqlite3
+import threading
+import concurrent.futures
 
 from .config import Config
 from .tools import *
-from .thread import Thread, ThreadPool
+from .dispatch import call_after
+from .session import session_pool
+from .thread import ThreadPool
+from .progress import progress_monitor
+from .limiter import rate_limiter
+from .writer import ChunkWriter
+from .scheduler import SegmentScheduler
+from .mirror import mirror_manager, get_urls
+
+class SegmentError(Exception):
+    def __init__(self, message: str, status: int = None):
+        Exception.__init__(self, message)
+
+        self.status = status
 
 class Downloader:
-    def __init__(self, info, onStart, onDownload, onMerge):
+    def __init__(self, info, onStart, onDownload, onMerge, onError = None, onRefresh = None):
         self.info, self.onStart, self.onDownload, self.onMerge = info, onStart, onDownload, onMerge
 
+        # onError 在重试次数用尽时调用，onRefresh 用于链接失效时重新获取下载信息
+        self.onError, self.onRefresh = onError, onRefresh
+
         self.init_utils()
 
     def init_utils(self):
-        self.total_size = 0
-        self.listen_thread = Thread(target = self.onListen, name = "ListenThread")
+        self.total_size = self.completed_size = 0
 
-        self.session = requests.session()
-        
         self.ThreadPool = ThreadPool()
+        self.worker_lock = threading.Lock()
+
+        self.flag = self.paused = self.stopped = self.failed = self.resuming = False
+        self.finished_event = threading.Event()
 
-        self.flag = False
         self.thread_info = {}
 
+        self.retry_info = {}
+        self.refresh_lock = threading.Lock()
+        self.refresh_time = 0
+
+        self.scheduler = SegmentScheduler(self.thread_info, Config.Download.min_segment_size, Config.Download.buffer_size + Config.Download.chunk_size)
+        self.worker_count = 0
+
         self.download_info = DownloaderInfo()
         self.download_info.init_info(self.info)
 
-    def add_url(self, info: dict):
-        path = os.path.join(Config.Download.path, info["file_name"])
+    def probe_url(self, info: dict):
+        # 节点测速或获取文件大小失败时，与分片下载使用相同的重试次数与退避时间
+        count = 0
+
+        while True:
+            try:
+                return self.probe(info)
 
-        file_size = self.get_total_size(info["url"], info["referer_url"], path)
-        self.total_size += file_size
+            except Exception:
+                count += 1
 
-        for index, chunk_list in enumerate(self.get_chunk_list(file_size, Config.Download.max_thread)):
-            url, referer_url, temp = info["url"], info["referer_url"], info.copy()
+                if count > Config.Download.max_retry or self.stopped:
+                    raise
 
-            thread_id = f"{info['type']}_{info['id']}_{index + 1}"
-            temp["chunk_list"] = chunk_list
-            self.thread_info[thread_id] = temp
+                time.sleep(self.get_backoff_delay(count))
 
-            self.download_id = info["id"]
+    def probe(self, info: dict):
+        path = os.path.join(get_temp_path(), info["file_name"])
 
-            self.ThreadPool.submit(self.range_download, args = (thread_id, url, referer_url, path, chunk_list,))
+        # 测速请求的响应中已包含文件大小，无需再单独请求
+        info["urls"], total_size = mirror_manager.rank(get_urls(info), info["referer_url"])
+        info["url"] = info["urls"][0]
+
+        info["file_size"] = self.get_total_size(info["url"], info["referer_url"], path, total_size)
+
+    def add_url(self, info: dict):
+        self.total_size += info["file_size"]
+
+        for chunk_list in self.get_chunk_list(info["file_size"], Config.Download.max_thread):
+            self.scheduler.add(info, chunk_list)
+
+        self.download_id = info["id"]
+
+        # 分片由调度器动态分配，线程数与原先的静态分片数保持一致
+        self.worker_count += Config.Download.max_thread
 
     def start(self, info: list):
         self.completed_size = 0
 
+        self.download_info.reset()
+
+        # 各路流的节点测速、获取大小与预分配文件互不依赖，同时进行
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers = max(len(info), 1)) as executor:
+                list(executor.map(self.probe_url, info))
+
+        except Exception:
+            # 重试次数用尽，与分片下载失败一样处理，任务不会一直停留在准备下载
+            if not self.stopped:
+                self.onFail()
+
+            return
+
         for entry in info:
             self.add_url(entry)
 
+        self.run()
+
+    def resume(self, thread_info: dict) -> bool:
+        if not self.restore(thread_info):
+            return False
+
+        self.run()
+
+        return True
+
+    def restore(self, thread_info: dict) -> bool:
+        # 校验预分配的文件，缺失或大小不符时无法从已保存的偏移继续
+        file_size = {}
+
+        for entry in thread_info.values():
+            path = os.path.join(get_temp_path(), entry["file_name"])
+
+            if "file_size" not in entry or not os.path.exists(path) or os.path.getsize(path) != entry["file_size"]:
+                return False
+
+            file_size[entry["file_name"]] = entry["file_size"]
+
+        self.scheduler.restore(thread_info)
+
+        self.total_size = sum(file_size.values())
+        self.completed_size = self.total_size - sum(max(entry["chunk_list"][1] - entry["chunk_list"][0] + 1, 0) for entry in thread_info.values())
+
+        self.worker_count = Config.Download.max_thread * len(file_size)
+
+        self.flag = self.completed_size >= self.total_size
+
+        self.update_download_info()
+
+        return True
+
+    def run(self):
+        for i in range(self.worker_count):
+            self.ThreadPool.submit(self.range_download, args = ())
+
         self.ThreadPool.start()
 
-        self.listen_thread.start()
+        progress_monitor.register(self)
 
-        wx.CallAfter(self.onStart)
+        call_after(self.onStart)
 
-        self.wait()
+        if not self.flag:
+            self.wait()
 
-        self.onFinished()
+        if self.failed:
+            self.ThreadPool.stop()
 
-    def restart(self):
-        for key, entry in self.thread_info.items():
-            path, chunk_list = os.path.join(Config.Download.path, entry["file_name"]), entry["chunk_list"]
+        elif not self.stopped:
+            self.onFinished()
 
-            if chunk_list[0] >= chunk_list[1]:
-                continue
+    def restart(self):
+        self.scheduler.reset()
 
-            self.ThreadPool.submit(target = self.range_download, args = (key, entry["url"], entry["referer_url"], path, chunk_list,))
+        for i in range(self.worker_count):
+            self.ThreadPool.submit(target = self.range_download, args = ())
         
         self.ThreadPool.start()
 
-    def range_download(self, thread_id: str, url: str, referer_url: str, path: str, chunk_list: list):
-        req = self.session.get(url, headers = get_header(referer_url, Config.User.sessdata, chunk_list), stream = True, proxies = get_proxy(), auth = get_auth())
-        
-        with open(path, "rb+") as f:
-            f.seek(chunk_list[0])
+    def range_download(self):
+        # 线程完成当前分片后继续向调度器领取，直至没有可拆分的剩余部分；暂停或取消后不再领取
+        while not (self.paused or self.stopped or self.failed):
+            thread_id = self.scheduler.acquire()
 
-            for chunk in req.iter_content(chunk_size = 1024):
-                if chunk:
-                    f.write(chunk)
-                    f.flush()
+            if thread_id is None or self.failed:
+                break
 
-                    self.completed_size += len(chunk)
+            try:
+                self.segment_download(thread_id)
 
-                    self.thread_info[thread_id]["chunk_list"][0] += len(chunk)
+            except Exception as e:
+                # 单个分片出错不影响其他分片，等待一段时间后从已写入的位置重试
+                delay = self.get_retry_delay(thread_id, e)
 
-                    if self.completed_size >= self.total_size:
-                        self.flag = True
+                if delay is None:
+                    self.onFail()
+                else:
+                    if self.is_expired_error(thread_id, e):
+                        self.refresh_url()
 
-    def onListen(self):
-        while not self.flag:
-            temp_size = self.completed_size
+                    time.sleep(delay)
 
-            time.sleep(1)
-            
-            info = {
-                "progress": int(self.completed_size / self.total_size * 100),
-                "speed": self.format_speed((self.completed_size - temp_size) / 1024),
-                "size": "{}/{}".format(format_size(self.completed_size / 1024), format_size(self.total_size / 1024))
-            }
-            
-            self.update_download_info()
+            finally:
+                self.scheduler.release(thread_id)
+
+    def segment_download(self, thread_id: str):
+        entry = self.thread_info[thread_id]
+        path, chunk_list = os.path.join(get_temp_path(), entry["file_name"]), entry["chunk_list"]
+
+        urls = get_urls(entry)
+        url = mirror_manager.acquire(urls)
+
+        try:
+            with session_pool.get(url, headers = get_header(entry["referer_url"], Config.User.sessdata, chunk_list), stream = True, timeout = (8, 30)) as req:
+                self.check_response(req.status_code, req.headers.get("Content-Range"), chunk_list)
 
-            wx.CallAfter(self.onDownload, info)
+                check_time, check_size = time.monotonic(), 0
+                
+                # 按 buffer_size 攒够数据后再一次性写入，避免每 1 KB 都触发 write 与 flush
+                with ChunkWriter(path, chunk_list, Config.Download.buffer_size, self.onFlush) as writer:
+                    for chunk in req.iter_content(chunk_size = rate_limiter.get_chunk_size(Config.Download.chunk_size)):
+                        # 暂停或取消时退出，退出前写入缓冲区中已有的数据，已保存的偏移与计数保持一致
+                        if self.paused or self.stopped or self.failed:
+                            break
+
+                        # 分片后半段被其他线程领取后，写到新的结束位置即停止
+                        if chunk and not writer.write(chunk):
+                            break
+
+                        delay = rate_limiter.reserve(self.info["id"], len(chunk))
+
+                        if delay:
+                            time.sleep(delay)
+
+                        check_size += len(chunk)
+
+                        if time.monotonic() - check_time >= mirror_manager.check_interval:
+                            # 当前节点明显变慢时中断连接，释放分片后由调度器重新分配到较快的节点
+                            if mirror_manager.check(url, urls, check_size / (time.monotonic() - check_time)):
+                                break
+
+                            check_time, check_size = time.monotonic(), 0
+                    else:
+                        self.check_finished(writer, chunk_list)
+
+        finally:
+            mirror_manager.release(url)
+
+    def check_response(self, status: int, content_range: str, chunk_list: list):
+        # 服务器忽略 Range 返回整个文件，或返回的区间与请求不符时，写入位置会错位
+        if status != 206:
+            raise SegmentError(f"HTTP {status}", status)
+
+        if not content_range or not content_range.startswith(f"bytes {chunk_list[0]}-"):
+            raise SegmentError(f"Unexpected Content-Range: {content_range}")
+
+    def check_finished(self, writer: ChunkWriter, chunk_list: list):
+        # 连接提前结束，实际收到的数据少于请求的区间
+        if not writer.finished:
+            raise SegmentError(f"Short read, {chunk_list[1] - chunk_list[0] + 1 - len(writer.buffer)} bytes missing")
+
+    def get_retry_delay(self, thread_id: str, error: Exception) -> float:
+        # 返回重试前等待的秒数，同一分片连续失败超过 max_retry 次时返回 None
+        offset = self.thread_info[thread_id]["chunk_list"][0]
+        count, last_offset = self.retry_info.get(thread_id, (0, offset))
+
+        # 上次出错后已有新数据写入，说明连接曾恢复正常，重新计算次数
+        count = count + 1 if offset == last_offset else 1
+
+        self.retry_info[thread_id] = (count, offset)
+
+        if count > Config.Download.max_retry:
+            return None
+
+        return self.get_backoff_delay(count)
+
+    def get_backoff_delay(self, count: int) -> float:
+        # 指数退避并加入随机抖动，避免各分片同时重试
+        return min(2 ** (count - 1), 30) * random.uniform(0.5, 1.5)
+
+    def is_expired_error(self, thread_id: str, error: Exception) -> bool:
+        # upos 签名过期后返回 403，部分节点返回 404 或 410
+        return getattr(error, "status", None) in (403, 404, 410) or is_url_expired(self.thread_info[thread_id]["url"])
+
+    def refresh_url(self):
+        if not self.onRefresh:
+            return
+
+        with self.refresh_lock:
+            # 多个分片同时出错时只重新获取一次
+            if time.monotonic() - self.refresh_time < 30:
+                return
+
+            self.refresh_time = time.monotonic()
+
+            try:
+                info_map = {entry["type"]: entry for entry in self.onRefresh()}
+
+            except Exception:
+                return
+
+            for entry in info_map.values():
+                entry["urls"] = mirror_manager.rank(get_urls(entry), entry["referer_url"])[0]
+
+            with self.scheduler.lock:
+                for entry in self.thread_info.values():
+                    new_entry = info_map.get(entry["type"])
+
+                    # 清晰度或编码发生变化时，新链接的数据与已下载部分不一致，不能替换
+                    if new_entry and new_entry.get("resolution") == entry.get("resolution") and new_entry.get("codec_id") == entry.get("codec_id"):
+                        entry["url"], entry["urls"] = new_entry["urls"][0], new_entry["urls"]
+
+    @property
+    def completed_size(self) -> int:
+        # 各线程只累加自己的计数，读取时再求和，避免多线程同时修改同一个值
+        return self.base_size + sum(self.counters.copy().values())
+
+    @completed_size.setter
+    def completed_size(self, size: int):
+        self.base_size, self.counters = size, {}
+
+    def onFlush(self, size: int):
+        ident = threading.get_ident()
+
+        self.counters[ident] = self.counters.get(ident, 0) + size
+
+        if self.completed_size >= self.total_size:
+            self.flag = True
+
+            self.finished_event.set()
 
     def onPause(self):
-        self.ThreadPool.stop()
-        self.listen_thread.pause()
+        # 各线程读取下一块数据前检查状态后自行退出，在后台等待其结束后再保存进度，不阻塞界面
+        self.paused, self.resuming = True, False
 
-        self.update_download_info()
+        threading.Thread(target = self.wait_workers, name = "PauseThread", daemon = True).start()
+
+    def wait_workers(self):
+        with self.worker_lock:
+            # 已经继续下载时不能等待新启动的线程
+            if not self.paused:
+                return
+
+            self.ThreadPool.stop()
+
+            self.update_download_info()
 
     def onResume(self):
-        self.restart()
-        self.listen_thread.resume()
+        self.resuming = True
+
+        threading.Thread(target = self.resume_workers, name = "ResumeThread", daemon = True).start()
+
+    def resume_workers(self):
+        # 暂停前的线程全部退出后再重新开始，避免同一分片被新旧线程同时下载
+        with self.worker_lock:
+            self.ThreadPool.stop()
+
+            if self.resuming and not self.stopped:
+                self.paused = self.resuming = False
+
+                self.restart()
 
     def onStop(self):
-        self.ThreadPool.stop()
-        self.listen_thread.stop()
+        # 线程检查到 stopped 后自行退出，无需等待
+        self.stopped = True
+
+        progress_monitor.unregister(self)
+        rate_limiter.remove(self.info["id"])
+
+        self.download_info.clear()
+
+        self.finished_event.set()
+
+    def onFail(self):
+        # 重试次数用尽，保留已下载的进度并唤醒等待中的线程
+        if self.failed:
+            return
+
+        self.failed = True
+
+        progress_monitor.unregister(self)
+        rate_limiter.remove(self.info["id"])
+
+        self.update_download_info()
+
+        self.finished_event.set()
+
+        if self.onError:
+            call_after(self.onError)
 
     def onFinished(self):
         self.ThreadPool.stop()
-        self.listen_thread.stop()
 
-        wx.CallAfter(self.onMerge)
+        progress_monitor.unregister(self)
+        rate_limiter.remove(self.info["id"])
+
+        call_after(self.onMerge)
 
     def wait(self):
-        while not self.flag:
-            time.sleep(1)
+        self.finished_event.wait()
     
-    def get_total_size(self, url: str, referer_url: str, path: str) -> int:
-        req = self.session.head(url, headers = get_header(referer_url))
-
-        total_size = int(req.headers["Content-Length"])
+    def get_total_size(self, url: str, referer_url: str, path: str, total_size: int = None) -> int:
+        if not total_size:
+            # 只有一个节点或测速均失败时，请求第一个字节，从 Content-Range 中读取文件大小
+            with session_pool.get(url, headers = get_header(referer_url, Config.User.sessdata, [0, 0]), stream = True, timeout = (8, 30)) as req:
+                total_size = self.get_range_size(req.headers.get("Content-Range"))
         
         with open(path, "wb") as f:
             f.truncate(total_size)
 
             return total_size
 
+    def get_stream_info(self) -> list:
+        # 每个文件取一个分片的信息，按 type 排序，音频在前
+        with self.scheduler.lock:
+            streams = {entry["file_name"]: entry for entry in self.thread_info.values()}
+
+        return sorted(streams.values(), key = lambda x: x["type"])
+
+    def get_prefix_size(self, file_name: str) -> int:
+        # 从文件开头起已连续写入的长度，即该文件所有未完成分片中最小的写入位置
+        with self.scheduler.lock:
+            entries = [entry for entry in self.thread_info.values() if entry["file_name"] == file_name]
+
+        offsets = [entry["chunk_list"][0] for entry in entries if entry["chunk_list"][0] <= entry["chunk_list"][1]]
+
+        if offsets:
+            return min(offsets)
+
+        return entries[0]["file_size"] if entries else 0
+
+    def get_range_size(self, content_range: str) -> int:
+        # 格式为 bytes 0-0/12345
+        if not content_range or "/" not in content_range:
+            raise SegmentError(f"Unexpected Content-Range: {content_range}")
+
+        return int(content_range.rsplit("/", 1)[1])
+
     def get_chunk_list(self, total_size: int, chunk: int) -> list:
         piece_size = int(total_size / chunk)
         chunk_list = []
 
         for i in range(chunk):
-            start = i * piece_size + 1 if i != 0 else 0 
-            end = (i + 1) * piece_size if i != chunk - 1 else total_size
+            start = i * piece_size
+            end = (i + 1) * piece_size - 1 if i != chunk - 1 else total_size - 1
 
             chunk_list.append([start, end])
 
@@ -158,47 +449,206 @@ class Downloader:
     def update_download_info(self):
         self.download_info.update_info(self.thread_info)
 
-class DownloaderInfo:
-    def __init__(self):
-        self.path = os.path.join(os.getcwd(), "download.json")
-    
-    def check_file(self):
-        if not os.path.exists(self.path):
-            contents = {}
+def create_downloader(info, onStart, onDownload, onMerge, onError = None, onRefresh = None) -> Downloader:
+    return get_downloader_class()(info, onStart, onDownload, onMerge, onError, onRefresh)
+
+def get_downloader_class():
+    if Config.Download.engine == "asyncio":
+        try:
+            from .engine import AsyncDownloader
+
+            return AsyncDownloader
+
+        except ImportError:
+            # aiohttp 为可选依赖，未安装时使用多线程下载
+            pass
 
-            self.write(contents)
+    return Downloader
 
+class DownloaderInfo:
     def read_info(self):
-        self.check_file()
-        
-        with open(self.path, "r", encoding = "utf-8") as f:
-            return json.loads(f.read())
+        return info_service.read()
     
     def init_info(self, info):
         self.id = info["id"]
-        contents = self.read_info()
 
-        contents[str(info["id"])] = {
-                "base_info": info,
-                "thread_info": {}
-            }
-        
-        self.write(contents)
+        info_service.init(self.id, info)
         
     def update_info(self, thread_info):
-        contents = self.read_info()
-
-        contents[f"{self.id}"]["thread_info"] = thread_info
-
-        self.write(contents)
+        info_service.update(self.id, thread_info)
 
-    def write(self, contents):
-        with open(self.path, "w", encoding = "utf-8") as f:
-            f.write(json.dumps(contents, ensure_ascii = False))
+    def reset(self):
+        info_service.reset(self.id)
     
     def clear(self):
-        contents = self.read_info()
+        info_service.remove(self.id)
+
+class DownloaderInfoService:
+    def __init__(self):
+        self.path = os.path.join(os.getcwd(), "download.db")
+        self.legacy_path = os.path.join(os.getcwd(), "download.json")
+
+        self.lock = threading.Lock()
+
+        self.db = None
+        self.timer = None
+
+        self.thread_info = {}
+        self.dirty = set()
+
+        atexit.register(self.flush)
+
+    def load(self):
+        if self.db:
+            return
+
+        self.db = sqlite3.connect(self.path, check_same_thread = False)
+
+        # WAL 模式下每次提交只追加日志，进程崩溃后可回滚到最近一次完整提交
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS task (id INTEGER PRIMARY KEY, base_info TEXT NOT NULL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS segment (task_id INTEGER NOT NULL, thread_id TEXT NOT NULL, info TEXT NOT NULL, chunk_start INTEGER NOT NULL, chunk_end INTEGER NOT NULL, PRIMARY KEY (task_id, thread_id))")
+
+        self.import_legacy()
+
+    def import_legacy(self):
+        # 迁移旧版本的 download.json
+        if not os.path.exists(self.legacy_path):
+            return
+
+        try:
+            with open(self.legacy_path, "r", encoding = "utf-8") as f:
+                contents = json.loads(f.read())
+
+        except (OSError, ValueError):
+            contents = {}
+
+        with self.db:
+            for key, value in contents.items():
+                self.db.execute("INSERT OR REPLACE INTO task (id, base_info) VALUES (?, ?)", (int(key), json.dumps(value["base_info"], ensure_ascii = False)))
+
+                self.write_segments(int(key), value["thread_info"])
+
+        os.remove(self.legacy_path)
+
+    def read(self) -> dict:
+        self.flush()
+
+        with self.lock:
+            self.load()
+
+            contents = {}
+
+            for id, base_info in self.db.execute("SELECT id, base_info FROM task"):
+                contents[str(id)] = {
+                    "base_info": json.loads(base_info),
+                    "thread_info": {}
+                }
+
+            for task_id, thread_id, info, chunk_start, chunk_end in self.db.execute("SELECT task_id, thread_id, info, chunk_start, chunk_end FROM segment"):
+                if str(task_id) in contents:
+                    entry = json.loads(info)
+                    entry["chunk_list"] = [chunk_start, chunk_end]
+
+                    contents[str(task_id)]["thread_info"][thread_id] = entry
+
+            return contents
+
+    def has_task(self) -> bool:
+        # 启动时判断是否有需要恢复的任务，无需读取全部记录
+        with self.lock:
+            self.load()
+
+            return self.db.execute("SELECT 1 FROM task LIMIT 1").fetchone() is not None
+
+    def init(self, id: int, info: dict):
+        self.init_list([info])
+
+    def init_list(self, info_list: list):
+        # 批量加入任务时合并为一次提交；恢复的任务在开始下载前保留已有的分片记录
+        with self.lock:
+            self.load()
+
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO task (id, base_info) VALUES (?, ?)", [(info["id"], json.dumps(self.get_base_info(info), ensure_ascii = False)) for info in info_list])
+
+            for info in info_list:
+                self.thread_info.setdefault(info["id"], {})
+
+    def get_base_info(self, info: dict) -> dict:
+        # 界面中的任务还保存着各操作的回调，不写入数据库
+        return {key: value for key, value in info.items() if key != "thread_info" and not key.endswith("_callback")}
+
+    def reset(self, id: int):
+        with self.lock:
+            self.load()
+
+            with self.db:
+                self.db.execute("DELETE FROM segment WHERE task_id = ?", (id,))
+
+            self.thread_info[id] = {}
+            self.dirty.discard(id)
+
+    def update(self, id: int, thread_info: dict):
+        with self.lock:
+            # 任务记录已清除时忽略迟到的进度更新
+            if id not in self.thread_info:
+                return
+
+            # 仅保存引用，实际写入时再读取最新的分片进度
+            self.thread_info[id] = thread_info
+            self.dirty.add(id)
+
+            self.schedule()
+
+    def remove(self, id: int):
+        with self.lock:
+            self.load()
+
+            with self.db:
+                self.db.execute("DELETE FROM task WHERE id = ?", (id,))
+                self.db.execute("DELETE FROM segment WHERE task_id = ?", (id,))
+
+            self.thread_info.pop(id, None)
+            self.dirty.discard(id)
+
+    def schedule(self):
+        # 所有任务的更新在 save_interval 内合并为一次提交
+        if not self.timer:
+            self.timer = threading.Timer(Config.Download.save_interval, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def write_segments(self, id: int, thread_info: dict):
+        # 分片信息可能正被下载线程修改，dict() 复制在 GIL 下是原子操作
+        rows = []
+
+        for thread_id, entry in dict(thread_info).items():
+            info = {key: value for key, value in entry.items() if key != "chunk_list"}
+
+            rows.append((id, thread_id, json.dumps(info, ensure_ascii = False), entry["chunk_list"][0], entry["chunk_list"][1]))
+
+        self.db.executemany("INSERT INTO segment (task_id, thread_id, info, chunk_start, chunk_end) VALUES (?, ?, ?, ?, ?) ON CONFLICT (task_id, thread_id) DO UPDATE SET info = excluded.info, chunk_start = excluded.chunk_start, chunk_end = excluded.chunk_end", rows)
+
+    def flush(self):
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+
+            if not self.dirty:
+                return
+
+            self.load()
+
+            # 只写入有变化的任务，每个分片按主键原地更新
+            with self.db:
+                for id in self.dirty:
+                    self.write_segments(id, self.thread_info[id])
 
-        contents.pop(f"{self.id}")
+            self.dirty.clear()
 
-        self.write(contents)
\ No newline at end of file
+info_service = DownloaderInfoService()
\ No newline at end of file
@@ -0,0 +1,307 @@
+import os
+import time
+import asyncio
+import aiohttp
+import threading
+import concurrent.futures
+
+from .config import Config
+from .tools import *
+from .dispatch import call_after
+from .writer import ChunkWriter
+from .scheduler import SegmentScheduler
+from .progress import progress_monitor
+from .limiter import rate_limiter
+from .mirror import mirror_manager, get_urls
+from .download import Downloader, DownloaderInfo
+
+class EventLoop:
+    loop = session = executor = None
+
+    lock = threading.Lock()
+
+    @classmethod
+    def get_loop(cls) -> asyncio.AbstractEventLoop:
+        # 所有任务的分片请求共用同一个事件循环线程
+        with cls.lock:
+            if not cls.loop:
+                cls.loop = asyncio.new_event_loop()
+
+                threading.Thread(target = cls.loop.run_forever, name = "EventLoopThread", daemon = True).start()
+
+        return cls.loop
+
+    @classmethod
+    def get_executor(cls) -> concurrent.futures.ThreadPoolExecutor:
+        # 写入磁盘在单独的线程池中进行，一次写入最多 buffer_size，不阻塞事件循环中其他分片的读取
+        with cls.lock:
+            if not cls.executor:
+                cls.executor = concurrent.futures.ThreadPoolExecutor(max_workers = 4, thread_name_prefix = "DiskWriteThread")
+
+        return cls.executor
+
+    @classmethod
+    def get_session(cls) -> aiohttp.ClientSession:
+        if not cls.session or cls.session.closed:
+            cls.session = aiohttp.ClientSession(connector = aiohttp.TCPConnector(limit = 0), timeout = aiohttp.ClientTimeout(sock_connect = 8, sock_read = 30))
+
+        return cls.session
+
+class AsyncDownloader(Downloader):
+    def init_utils(self):
+        self.total_size = self.completed_size = 0
+
+        self.loop = EventLoop.get_loop()
+
+        self.flag = self.paused = self.stopped = self.failed = False
+        self.finished_event = threading.Event()
+
+        self.thread_info = {}
+
+        self.retry_info = {}
+        self.refresh_lock = threading.Lock()
+        self.refresh_time = 0
+
+        self.scheduler = SegmentScheduler(self.thread_info, Config.Download.min_segment_size, Config.Download.buffer_size + Config.Download.chunk_size)
+        self.worker_count = 0
+
+        # 已取消但可能仍在写入缓冲区数据的分片任务
+        self.workers, self.cancelled_workers = [], set()
+
+        self.download_info = DownloaderInfo()
+        self.download_info.init_info(self.info)
+
+    async def probe_url(self, info: dict):
+        count = 0
+
+        while True:
+            try:
+                return await self.probe(info)
+
+            except Exception:
+                count += 1
+
+                if count > Config.Download.max_retry or self.stopped:
+                    raise
+
+                await asyncio.sleep(self.get_backoff_delay(count))
+
+    async def probe(self, info: dict):
+        path = os.path.join(get_temp_path(), info["file_name"])
+
+        # 测速使用同步请求，放到线程池中执行，避免阻塞事件循环
+        info["urls"], total_size = await self.loop.run_in_executor(None, mirror_manager.rank, get_urls(info), info["referer_url"])
+        info["url"] = info["urls"][0]
+
+        info["file_size"] = await self.get_total_size(info["url"], info["referer_url"], path, total_size)
+
+    def start(self, info: list):
+        self.download_info.reset()
+
+        self.run(info)
+
+    def run(self, info: list = None):
+        self.future = asyncio.run_coroutine_threadsafe(self.run_async(info or []), self.loop)
+
+        try:
+            self.future.result()
+        except concurrent.futures.CancelledError:
+            return
+
+        if not self.failed:
+            self.onFinished()
+
+    async def run_async(self, info: list):
+        self.session = EventLoop.get_session()
+        self.finished = asyncio.Event()
+
+        try:
+            await asyncio.gather(*[self.probe_url(entry) for entry in info])
+
+        except Exception:
+            if not self.stopped:
+                self.onFail()
+
+            return
+
+        for entry in info:
+            self.add_url(entry)
+
+        if self.flag:
+            return
+
+        self.restart()
+
+        progress_monitor.register(self)
+
+        call_after(self.onStart)
+
+        try:
+            await self.finished.wait()
+        finally:
+            progress_monitor.unregister(self)
+            rate_limiter.remove(self.info["id"])
+
+            self.cancel_workers()
+
+    def restart(self):
+        self.scheduler.reset()
+
+        self.workers = [asyncio.create_task(self.range_download()) for i in range(self.worker_count)]
+
+    async def range_download(self):
+        while True:
+            thread_id = self.scheduler.acquire()
+
+            if thread_id is None or self.failed:
+                break
+
+            try:
+                await self.segment_download(thread_id)
+
+            except Exception as e:
+                delay = self.get_retry_delay(thread_id, e)
+
+                if delay is None:
+                    self.onFail()
+                else:
+                    if self.is_expired_error(thread_id, e):
+                        await self.loop.run_in_executor(None, self.refresh_url)
+
+                    await asyncio.sleep(delay)
+
+            finally:
+                self.scheduler.release(thread_id)
+
+    async def segment_download(self, thread_id: str):
+        entry = self.thread_info[thread_id]
+        path, chunk_list = os.path.join(get_temp_path(), entry["file_name"]), entry["chunk_list"]
+
+        urls = get_urls(entry)
+        url = mirror_manager.acquire(urls)
+
+        try:
+            async with self.session.get(url, headers = get_header(entry["referer_url"], Config.User.sessdata, chunk_list), **get_aiohttp_proxy()) as req:
+                self.check_response(req.status, req.headers.get("Content-Range"), chunk_list)
+
+                check_time, check_size = time.monotonic(), 0
+
+                writer = ChunkWriter(path, chunk_list, Config.Download.buffer_size, self.onFlush)
+
+                try:
+                    async for chunk in req.content.iter_chunked(rate_limiter.get_chunk_size(Config.Download.chunk_size)):
+                        writer.append(chunk)
+
+                        if writer.full:
+                            await self.run_writer(writer.flush)
+
+                        if writer.finished:
+                            break
+
+                        delay = rate_limiter.reserve(self.info["id"], len(chunk))
+
+                        if delay:
+                            await asyncio.sleep(delay)
+
+                        check_size += len(chunk)
+
+                        if time.monotonic() - check_time >= mirror_manager.check_interval:
+                            if mirror_manager.check(url, urls, check_size / (time.monotonic() - check_time)):
+                                break
+
+                            check_time, check_size = time.monotonic(), 0
+                    else:
+                        self.check_finished(writer, chunk_list)
+
+                finally:
+                    # 取消任务时也要写入缓冲区中已有的数据，再次取消不会中断写入
+                    await asyncio.shield(self.run_writer(writer.close))
+
+        finally:
+            mirror_manager.release(url)
+
+    def run_writer(self, target) -> asyncio.Future:
+        return self.loop.run_in_executor(EventLoop.get_executor(), target)
+
+    def onFlush(self, size: int):
+        # 在写入线程中调用，asyncio.Event 只能在事件循环线程中设置
+        Downloader.onFlush(self, size)
+
+        if self.flag:
+            self.loop.call_soon_threadsafe(self.finished.set)
+
+    def onFail(self):
+        Downloader.onFail(self)
+
+        self.finished.set()
+
+    def cancel_workers(self):
+        for worker in self.workers:
+            worker.cancel()
+
+        self.cancelled_workers.update(self.workers)
+
+        self.workers.clear()
+
+    async def wait_workers(self):
+        # 已取消的任务仍可能在写入线程中写入缓冲区，写完并释放分片后才能重新分配，已取消的任务不再次取消
+        workers = list(self.cancelled_workers)
+
+        await asyncio.gather(*workers, return_exceptions = True)
+
+        self.cancelled_workers.difference_update(workers)
+
+    async def pause_workers(self):
+        self.cancel_workers()
+
+        await self.wait_workers()
+
+        # 等待期间已经继续下载时，由新的任务保存进度
+        if self.paused:
+            await self.loop.run_in_executor(None, self.update_download_info)
+
+    async def resume_workers(self):
+        await self.wait_workers()
+
+        if not (self.paused or self.stopped or self.failed):
+            self.restart()
+
+    def onPause(self):
+        self.paused = True
+
+        asyncio.run_coroutine_threadsafe(self.pause_workers(), self.loop)
+
+    def onResume(self):
+        self.paused = False
+
+        asyncio.run_coroutine_threadsafe(self.resume_workers(), self.loop)
+
+    def onStop(self):
+        self.stopped = True
+
+        if hasattr(self, "future"):
+            self.future.cancel()
+
+        self.download_info.clear()
+
+    def onFinished(self):
+        call_after(self.onMerge)
+
+    async def get_total_size(self, url: str, referer_url: str, path: str, total_size: int = None) -> int:
+        if not total_size:
+            async with self.session.get(url, headers = get_header(referer_url, Config.User.sessdata, [0, 0]), **get_aiohttp_proxy()) as req:
+                total_size = self.get_range_size(req.headers.get("Content-Range"))
+
+        with open(path, "wb") as f:
+            f.truncate(total_size)
+
+            return total_size
+
+def get_aiohttp_proxy() -> dict:
+    if Config.Proxy.proxy:
+        return {
+            "proxy": f"http://{Config.Proxy.ip}:{Config.Proxy.port}",
+            "proxy_auth": aiohttp.BasicAuth(Config.Proxy.uname, Config.Proxy.passwd) if Config.Proxy.auth else None
+        }
+    else:
+        return {}
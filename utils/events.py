@@ -0,0 +1,30 @@
+import threading
+
+class EventHub:
+    # 下载状态与进度的变化在此广播给控制接口等订阅者，没有订阅者时不做任何处理
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self.listeners = []
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.listeners = self.listeners + [callback]
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.listeners = [listener for listener in self.listeners if listener is not callback]
+
+    def publish(self, event: str, **kwargs):
+        # 回调在发布者的线程中执行，订阅者只应将事件放入自己的队列
+        listeners = self.listeners
+
+        if not listeners:
+            return
+
+        data = {"event": event, **kwargs}
+
+        for callback in listeners:
+            callback(data)
+
+event_hub = EventHub()
@@ -0,0 +1,125 @@
+import time
+import threading
+
+from .config import Config
+
+class TokenBucket:
+    def __init__(self, rate: int = 0):
+        self.lock = threading.Lock()
+
+        self.set_rate(rate)
+
+    def set_rate(self, rate: int):
+        with self.lock:
+            self.rate, self.tokens, self.timestamp = rate, rate, time.monotonic()
+
+    def reserve(self, size: int) -> float:
+        # 未限速时直接返回，不加锁
+        if not self.rate:
+            return 0
+
+        with self.lock:
+            now = time.monotonic()
+
+            # 令牌上限为 1 秒的配额，允许透支，透支部分按先后顺序换算为等待时间
+            self.tokens = min(self.rate, self.tokens + (now - self.timestamp) * self.rate) - size
+            self.timestamp = now
+
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+class RateLimiter:
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self.global_bucket = TokenBucket()
+        self.task_bucket = {}
+
+        self.schedule = []
+        self.check_time = 0
+
+        self.update()
+
+    def update(self):
+        # 修改限速设置后调用，正在下载的任务立即生效
+        self.schedule = self.parse_schedule(Config.Download.speed_limit_schedule)
+        self.check_time = 0
+
+        self.global_bucket.set_rate(self.get_global_rate())
+
+        with self.lock:
+            for bucket in self.task_bucket.values():
+                bucket.set_rate(Config.Download.task_speed_limit * 1024)
+
+    def reserve(self, task_id: int, size: int) -> float:
+        if self.schedule:
+            self.check_schedule()
+
+        delay = self.global_bucket.reserve(size)
+
+        if Config.Download.task_speed_limit:
+            delay = max(delay, self.get_task_bucket(task_id).reserve(size))
+
+        return delay
+
+    def get_chunk_size(self, chunk_size: int) -> int:
+        # 限速时缩小单次读取量，让各分片轮流取得令牌
+        if not self.is_limited():
+            return chunk_size
+
+        rates = [rate for rate in [self.global_bucket.rate, Config.Download.task_speed_limit * 1024] if rate]
+
+        return max(min(min(rates) // 10, chunk_size), 16384)
+
+    def is_limited(self) -> bool:
+        return bool(self.global_bucket.rate or Config.Download.task_speed_limit)
+
+    def get_task_bucket(self, task_id: int) -> TokenBucket:
+        with self.lock:
+            if task_id not in self.task_bucket:
+                self.task_bucket[task_id] = TokenBucket(Config.Download.task_speed_limit * 1024)
+
+            return self.task_bucket[task_id]
+
+    def remove(self, task_id: int):
+        with self.lock:
+            self.task_bucket.pop(task_id, None)
+
+    def check_schedule(self):
+        # 每 30 秒检查一次是否进入或离开限速时段
+        now = time.monotonic()
+
+        if now - self.check_time > 30:
+            self.check_time = now
+
+            rate = self.get_global_rate()
+
+            if rate != self.global_bucket.rate:
+                self.global_bucket.set_rate(rate)
+
+    def get_global_rate(self) -> int:
+        minutes = time.localtime().tm_hour * 60 + time.localtime().tm_min
+
+        for start, end, rate in self.schedule:
+            # 支持跨越零点的时段，如 22:00-06:00
+            if (start <= minutes < end) if start <= end else (minutes >= start or minutes < end):
+                return rate * 1024
+
+        return Config.Download.speed_limit * 1024
+
+    def parse_schedule(self, schedule: str) -> list:
+        # 格式：08:00-18:00=1024;22:00-06:00=0，单位 KB/s，0 表示不限速
+        result = []
+
+        for item in filter(None, schedule.replace(" ", "").split(";")):
+            try:
+                period, rate = item.split("=")
+                start, end = [int(hour) * 60 + int(minute) for hour, minute in (value.split(":") for value in period.split("-"))]
+
+                result.append((start, end, int(rate)))
+
+            except ValueError:
+                continue
+
+        return result
+
+rate_limiter = RateLimiter()
@@ -1,5 +1,4 @@
 import json
-import qrcode
 import requests
 from io import BytesIO
 
@@ -25,6 +24,9 @@ class QRLogin:
         QRLoginInfo.qrcode_key = resp["data"]["qrcode_key"]
     
     def get_qrcode(self):
+        # 只在登录窗口中使用，导入 qrcode 及其依赖的 PIL 较慢，不在启动时导入
+        import qrcode
+
         pic = BytesIO()
 
         qrcode.make(QRLoginInfo.url).save(pic)
@@ -45,7 +47,7 @@ class QRLogin:
         url = "https://api.bilibili.com/x/web-interface/nav"
 
         if refresh:
-            req = requests.get(url, headers = get_header(cookie = Config.User.sessdata), proxies = get_proxy(), auth = get_auth())
+            req = session_pool.get(url, headers = get_header(cookie = Config.User.sessdata))
         else:
             former_headers = get_header()
             
@@ -65,9 +67,9 @@ class QRLogin:
         Config.User.login = False
         Config.User.face = Config.User.uname = Config.User.sessdata = ""
 
-        conf.config.set("user", "login", str(int(Config.User.login)))
-        conf.config.set("user", "face", Config.User.face)
-        conf.config.set("user", "uname", Config.User.uname)
-        conf.config.set("user", "sessdata", Config.User.sessdata)
+        conf.set("user", "login", str(int(Config.User.login)))
+        conf.set("user", "face", Config.User.face)
+        conf.set("user", "uname", Config.User.uname)
+        conf.set("user", "sessdata", Config.User.sessdata)
 
         conf.save()
\ No newline at end of file
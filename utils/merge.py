@@ -0,0 +1,282 @@
+import os
+import time
+import queue
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from .config import Config
+from .tools import get_temp_path, move_file, remove_files
+from .dispatch import call_after
+from .progress import progress_monitor
+
+class PrefixRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        stream = self.server.streams.get(self.path.lstrip("/"))
+
+        if not stream:
+            self.send_error(404)
+            return
+
+        # 不返回 Accept-Ranges，ffmpeg 将输入视为不可寻址的流，只按顺序读取
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(stream["size"]))
+        self.end_headers()
+
+        with open(stream["path"], "rb") as f:
+            offset = 0
+
+            while offset < stream["size"]:
+                # 只发送已连续写入磁盘的部分，其余部分等待下载线程写入
+                prefix = stream["get_prefix"]()
+
+                if offset >= prefix:
+                    if stream["closed"].wait(self.server.interval):
+                        return
+
+                    continue
+
+                data = f.read(min(prefix - offset, 1048576))
+
+                try:
+                    self.wfile.write(data)
+                except OSError:
+                    return
+
+                offset += len(data)
+
+    def log_message(self, *args):
+        pass
+
+class PrefixServer:
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+
+        self.lock = threading.Lock()
+
+        self.server = None
+
+    def get_server(self) -> ThreadingHTTPServer:
+        with self.lock:
+            if not self.server:
+                self.server = ThreadingHTTPServer(("127.0.0.1", 0), PrefixRequestHandler)
+                self.server.daemon_threads = True
+                self.server.streams, self.server.interval = {}, self.interval
+
+                threading.Thread(target = self.server.serve_forever, name = "PrefixServerThread", daemon = True).start()
+
+            return self.server
+
+    def register(self, name: str, path: str, size: int, get_prefix) -> str:
+        server = self.get_server()
+
+        server.streams[name] = {
+            "path": path,
+            "size": size,
+            "get_prefix": get_prefix,
+            "closed": threading.Event()
+        }
+
+        return f"http://127.0.0.1:{server.server_port}/{name}"
+
+    def unregister(self, name: str):
+        if self.server:
+            stream = self.server.streams.pop(name, None)
+
+            if stream:
+                stream["closed"].set()
+
+class StreamingMerger:
+    def __init__(self, downloader, output_path: str):
+        # 先写入临时目录，成功后再移动到下载目录，取消或失败时不在下载目录中留下不完整的文件
+        self.downloader, self.output_path = downloader, output_path
+
+        self.temp_name = f"output_{downloader.info['id']}.mp4"
+
+        self.names, self.process = [], None
+
+        self.finished_event = threading.Event()
+        self.returncode = None
+
+    def start(self, entries: list):
+        # entries 依次为音频与视频，与下载完成后合并时的输入顺序一致
+        cmd = [Config.Download.ffmpeg_path, "-v", "quiet", "-y"]
+
+        for entry in entries:
+            name = f"{self.downloader.info['id']}/{entry['file_name']}"
+            path = os.path.join(get_temp_path(), entry["file_name"])
+
+            url = prefix_server.register(name, path, entry["file_size"], lambda file_name = entry["file_name"]: self.downloader.get_prefix_size(file_name))
+
+            self.names.append(name)
+
+            cmd.extend(["-i", url])
+
+        cmd.extend(["-acodec", "copy", "-vcodec", "copy", self.temp_name])
+
+        try:
+            # 与下载同时进行，始终以较低的优先级运行
+            self.process = subprocess.Popen(cmd, cwd = get_temp_path(), stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, **get_low_priority_args())
+
+        except OSError:
+            self.close()
+
+            return
+
+        threading.Thread(target = self.wait_process, name = "StreamingMergeThread", daemon = True).start()
+
+    def wait_process(self):
+        self.returncode = self.process.wait()
+
+        if self.returncode:
+            self.remove_output()
+
+        self.close()
+
+        self.finished_event.set()
+
+    def wait(self) -> bool:
+        # 返回 False 时由调用方改为下载完成后再合并
+        if not self.process:
+            return False
+
+        self.finished_event.wait()
+
+        if self.returncode:
+            return False
+
+        try:
+            move_file(os.path.join(get_temp_path(), self.temp_name), self.output_path)
+
+        except OSError:
+            self.remove_output()
+
+            return False
+
+        return True
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+
+        self.close()
+
+        # 等待进程退出后再删除，Windows 下无法删除正在写入的文件
+        if self.process:
+            self.finished_event.wait()
+
+            self.remove_output()
+
+    def remove_output(self):
+        remove_files(get_temp_path(), [self.temp_name])
+
+    def close(self):
+        for name in self.names:
+            prefix_server.unregister(name)
+
+class MergeQueue:
+    def __init__(self):
+        self.queue = queue.PriorityQueue()
+
+        self.lock = threading.Lock()
+
+        self.workers = []
+        self.running = self.index = 0
+
+    def submit(self, size: int, target, onProgress, onFinished, streaming: bool = False):
+        # 按文件大小排序，小文件先合并；target 接收进度回调，返回是否合并成功
+        if streaming:
+            # 该任务已在边下载边合并，只需等待 ffmpeg 读取剩余数据，不经过队列，也不等待其他任务下载结束
+            self.hold()
+
+            threading.Thread(target = self.run_task, args = (target, onProgress, onFinished), name = "MergeThread", daemon = True).start()
+
+            return
+
+        with self.lock:
+            self.index += 1
+
+            self.queue.put((size, self.index, target, onProgress, onFinished))
+
+            if len(self.workers) < get_merge_thread():
+                worker = threading.Thread(target = self.run, name = "MergeThread", daemon = True)
+                worker.start()
+
+                self.workers.append(worker)
+
+    def run(self):
+        while True:
+            size, index, target, onProgress, onFinished = self.queue.get()
+
+            self.acquire()
+
+            self.run_task(target, onProgress, onFinished)
+
+    def run_task(self, target, onProgress, onFinished):
+        # 调用前已计入正在运行的合并任务
+        try:
+            result = target(lambda progress: call_after(onProgress, progress))
+
+        except Exception:
+            result = False
+
+        finally:
+            self.release()
+
+        call_after(onFinished, result)
+
+    def acquire(self):
+        # 有任务正在下载时只允许一个合并任务运行，避免与下载同时大量读写同一磁盘
+        while True:
+            with self.lock:
+                if not self.running or not progress_monitor.get_active_count():
+                    self.running += 1
+                    return
+
+            time.sleep(1)
+
+    def hold(self):
+        # 边下载边合并的任务在下载完成后才计入正在运行的合并任务，下载期间不占用其他任务的合并
+        with self.lock:
+            self.running += 1
+
+    def release(self):
+        with self.lock:
+            self.running -= 1
+
+def get_merge_thread() -> int:
+    # 0 表示自动，合并只复制数据，主要受磁盘限制，最多 4 个
+    return Config.Download.merge_thread or max(1, min(4, (os.cpu_count() or 2) // 2))
+
+def get_priority_args() -> dict:
+    # 有任务正在下载时降低 ffmpeg 的优先级，优先保证下载
+    if not progress_monitor.get_active_count():
+        return {}
+
+    return get_low_priority_args()
+
+def get_low_priority_args() -> dict:
+    if os.name == "nt":
+        return {"creationflags": subprocess.BELOW_NORMAL_PRIORITY_CLASS}
+    else:
+        return {"preexec_fn": lambda: os.nice(10)}
+
+def run_ffmpeg(args: list, cwd: str, input_size: int, onProgress = None) -> int:
+    cmd = [Config.Download.ffmpeg_path, "-v", "quiet", "-y", "-nostats", "-progress", "pipe:1"] + args
+
+    process = subprocess.Popen(cmd, cwd = cwd, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, text = True, **get_priority_args())
+
+    # -progress 每隔一段时间输出一组 key=value，-c copy 时输出大小与输入大小基本一致，按 total_size 计算进度
+    for line in process.stdout:
+        key, value = line.strip().partition("=")[::2]
+
+        if key == "total_size" and value.isdigit() and onProgress and input_size:
+            onProgress(min(int(value) * 100 // input_size, 100))
+
+    return process.wait()
+
+prefix_server = PrefixServer()
+merge_queue = MergeQueue()
@@ -0,0 +1,130 @@
+import time
+import threading
+import concurrent.futures
+from urllib.parse import urlparse
+
+from .config import Config
+from .tools import get_header
+from .session import session_pool
+from .limiter import rate_limiter
+
+class MirrorManager:
+    def __init__(self, probe_size: int = 262144, check_interval: float = 3, alpha: float = 0.3):
+        self.probe_size, self.check_interval, self.alpha = probe_size, check_interval, alpha
+
+        self.lock = threading.Lock()
+
+        # 以主机为单位记录单连接速度与正在使用的连接数，同一节点上的音视频流共用统计
+        self.speed = {}
+        self.active = {}
+
+    def rank(self, urls: list, referer_url: str) -> tuple:
+        # 并行向每个候选节点请求一小段数据，按实测速度从快到慢排序，同时返回响应中的文件大小，只有一个节点时不测速，大小为 None
+        urls = list(dict.fromkeys(urls))
+
+        if len(urls) == 1:
+            return urls, None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers = len(urls)) as executor:
+            result = dict(zip(urls, executor.map(lambda url: self.probe(url, referer_url), urls)))
+
+        with self.lock:
+            for url, (speed, total_size) in result.items():
+                if speed:
+                    self.speed[self.get_host(url)] = speed
+
+        total_size = next((total_size for speed, total_size in result.values() if total_size), None)
+
+        return sorted(urls, key = lambda url: result[url][0], reverse = True), total_size
+
+    def probe(self, url: str, referer_url: str) -> tuple:
+        # 返回 (速度, 文件大小)，请求失败时均为空
+        start_time = time.monotonic()
+
+        try:
+            req = session_pool.get(url, headers = get_header(referer_url, Config.User.sessdata, [0, self.probe_size - 1]), stream = True, timeout = 5)
+
+            size = sum(len(chunk) for chunk in req.iter_content(chunk_size = 65536))
+
+            req.close()
+
+        except Exception:
+            return 0, None
+
+        if req.status_code not in (200, 206):
+            return 0, None
+
+        # 耗时包含建立连接与首字节延迟，延迟高的节点得分也会相应降低
+        return size / max(time.monotonic() - start_time, 0.001), get_content_size(req.status_code, req.headers)
+
+    def acquire(self, urls: list) -> str:
+        # 在已知速度的节点中按 速度 / (连接数 + 1) 选择，让分片分散到多个较快的节点上
+        with self.lock:
+            url = max(urls, key = lambda url: self.get_speed(url) / (self.active.get(self.get_host(url), 0) + 1))
+
+            host = self.get_host(url)
+            self.active[host] = self.active.get(host, 0) + 1
+
+            return url
+
+    def release(self, url: str):
+        with self.lock:
+            host = self.get_host(url)
+
+            self.active[host] = max(self.active.get(host, 0) - 1, 0)
+
+    def update(self, url: str, speed: float):
+        with self.lock:
+            host = self.get_host(url)
+
+            self.speed[host] = self.alpha * speed + (1 - self.alpha) * self.speed[host] if host in self.speed else speed
+
+    def check(self, url: str, urls: list, speed: float) -> bool:
+        # 分片下载时每隔 check_interval 秒调用一次，返回 True 表示应中断当前连接并换用其他节点
+        self.update(url, speed)
+
+        # 限速时各连接的速度由令牌桶决定，不能反映节点本身的快慢
+        if rate_limiter.is_limited() or not self.is_slow(url, urls, speed):
+            return False
+
+        self.penalize(url)
+
+        return True
+
+    def is_slow(self, url: str, urls: list, speed: float) -> bool:
+        # 低于阈值且其他节点的单连接速度至少快一倍时才切换，避免整体网络变慢时在节点间来回切换
+        if speed >= Config.Download.mirror_min_speed * 1024 or len(urls) == 1:
+            return False
+
+        with self.lock:
+            return any(self.get_speed(other) > speed * 2 for other in urls if self.get_host(other) != self.get_host(url))
+
+    def penalize(self, url: str):
+        # 切换后降低该节点的得分，后续分片优先分配到其他节点
+        with self.lock:
+            host = self.get_host(url)
+
+            self.speed[host] = self.speed.get(host, 0) / 2
+
+    def get_speed(self, url: str) -> float:
+        return self.speed.get(self.get_host(url), 0)
+
+    def get_host(self, url: str) -> str:
+        return urlparse(url).netloc
+
+def get_content_size(status: int, headers) -> int:
+    # 206 时从 Content-Range (bytes 0-262143/12345) 中读取，服务器忽略 Range 返回整个文件时即为 Content-Length
+    try:
+        if status == 206:
+            return int(headers["Content-Range"].rsplit("/", 1)[1])
+
+        return int(headers["Content-Length"])
+
+    except (KeyError, ValueError):
+        return None
+
+def get_urls(entry: dict) -> list:
+    # 旧版本保存的任务只有 url 字段
+    return entry.get("urls") or [entry["url"]]
+
+mirror_manager = MirrorManager()
@@ -0,0 +1,93 @@
+import copy
+import threading
+
+from .config import Config
+from .tools import *
+from .video import VideoInfo, VideoParser
+from .bangumi import BangumiInfo, BangumiParser
+from .activity import ActivityInfo, ActivityParser
+
+class ParseError(Exception):
+    message_map = {
+        100: "不受支持的链接",
+        101: "视频不存在",
+        102: "无法获取视频信息，请登录后再试"
+    }
+
+    def __init__(self, code: int):
+        Exception.__init__(self, self.message_map.get(code, "未知错误"))
+
+        self.code = code
+
+def format_info_entry(type: int, url: str, title: str, pic: str, bvid: str = None, cid: str = None, resolution: int = None) -> dict:
+    return {
+        "id": get_new_id(),
+        "url": url,
+        "type": type,
+        "bvid": bvid,
+        "cid": cid,
+        "title": get_legal_name(title),
+        "pic": pic,
+        "size": None,
+        "status": "wait",
+        "resolution": resolution if resolution else None,
+    }
+
+def get_resolution(info: VideoInfo | BangumiInfo, resolution: int = None) -> int:
+    # 与界面中清晰度列表的默认选项一致，不可用时选择最高的清晰度
+    resolution = resolution or Config.Download.resolution
+
+    return resolution if resolution in info.resolution_id else info.resolution_id[0]
+
+class URLParser:
+    # 不依赖界面的解析流程，解析链接中的全部视频，返回下载任务列表，供命令行、控制接口等场景使用
+    lock = threading.Lock()
+
+    def __init__(self):
+        self.video_parser = VideoParser(self.onError)
+        self.bangumi_parser = BangumiParser(self.onError)
+        self.activity_parser = ActivityParser(self.onError)
+
+    def parse(self, url: str, resolution: int = None, bypass: bool = False) -> list:
+        # 各解析器将结果保存在类属性中，解析完成后恢复，不影响主界面中已解析的列表
+        with self.lock:
+            state = {info: {key: copy.copy(value) for key, value in vars(info).items() if not key.startswith("__")} for info in (VideoInfo, BangumiInfo, ActivityInfo)}
+
+            try:
+                return self.parse_url(url, resolution, bypass)
+
+            finally:
+                for info, attrs in state.items():
+                    for key, value in attrs.items():
+                        setattr(info, key, value)
+
+    def parse_url(self, url: str, resolution: int = None, bypass: bool = False) -> list:
+        match find_str("av|BV|ep|ss|md|b23.tv|blackboard|festival", url):
+            case "av" | "BV":
+                self.video_parser.parse_url(url, bypass)
+
+                return self.get_entry_list(Config.Type.VIDEO, VideoInfo, get_resolution(VideoInfo, resolution))
+
+            case "ep" | "ss" | "md":
+                self.bangumi_parser.parse_url(url, bypass)
+
+                return self.get_entry_list(Config.Type.BANGUMI, BangumiInfo, get_resolution(BangumiInfo, resolution))
+
+            case "b23.tv":
+                return self.parse_url(process_shorklink(url), resolution, bypass)
+
+            case "blackboard" | "festival":
+                self.activity_parser.parse_url(url)
+
+                return self.parse_url(ActivityInfo.new_url, resolution, bypass)
+
+            case _:
+                self.onError(100)
+
+    def get_entry_list(self, type: int, info: VideoInfo | BangumiInfo, resolution: int) -> list:
+        # 与界面中全选后下载的结果一致
+        return [format_info_entry(type, info.url, entry["title"], entry["pic"], entry["bvid"], entry["cid"], resolution) for entry in info.episode_list]
+
+    def onError(self, code: int):
+        # 各解析器出错后不会中断，由异常结束解析流程
+        raise ParseError(code)
@@ -0,0 +1,55 @@
+import threading
+import concurrent.futures
+
+from .tools import is_url_expired
+
+class PlayurlPrefetcher:
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+
+        self.lock = threading.Lock()
+
+        self.executor = None
+        self.cache = {}
+
+    def prefetch(self, id: int, target):
+        # target 在线程池中执行，返回的 dash 数据按任务 id 缓存，直到任务开始时取出
+        with self.lock:
+            future = self.cache.get(id)
+
+            if future and not (future.done() and self.is_expired(future)):
+                return
+
+            if not self.executor:
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = self.max_workers, thread_name_prefix = "PrefetchThread")
+
+            self.cache[id] = self.executor.submit(target)
+
+    def get(self, id: int):
+        with self.lock:
+            future = self.cache.pop(id, None)
+
+        if not future or self.is_expired(future):
+            return None
+
+        # 仍在获取中则等待其完成，不再重复请求
+        return future.result()
+
+    def remove(self, id: int):
+        with self.lock:
+            future = self.cache.pop(id, None)
+
+        if future:
+            future.cancel()
+
+    def is_expired(self, future: concurrent.futures.Future) -> bool:
+        # 获取失败或链接的 deadline 即将到期时视为无效，由调用方重新获取
+        try:
+            json_dash = future.result()
+
+            return is_url_expired(json_dash["video"][0]["baseUrl"])
+
+        except Exception:
+            return True
+
+playurl_prefetcher = PlayurlPrefetcher()
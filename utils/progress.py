@@ -0,0 +1,82 @@
+import time
+import threading
+
+from .tools import *
+from .dispatch import call_after
+from .events import event_hub
+
+class ProgressMonitor:
+    def __init__(self, interval: float = 1, alpha: float = 0.3):
+        self.interval, self.alpha = interval, alpha
+
+        self.lock = threading.Lock()
+
+        self.tasks = {}
+        self.thread = None
+
+    def register(self, downloader):
+        with self.lock:
+            self.tasks[downloader] = {
+                "last_size": downloader.completed_size,
+                "speed": None
+            }
+
+            if not self.thread:
+                self.thread = threading.Thread(target = self.run, name = "ProgressThread", daemon = True)
+                self.thread.start()
+
+    def unregister(self, downloader):
+        with self.lock:
+            self.tasks.pop(downloader, None)
+
+    def get_active_count(self) -> int:
+        with self.lock:
+            return sum(1 for downloader in self.tasks if not downloader.paused)
+
+    def run(self):
+        # 所有任务共用一个计时线程，每个周期只向 UI 线程投递一次批量更新
+        while True:
+            time.sleep(self.interval)
+
+            with self.lock:
+                tasks = list(self.tasks.items())
+
+            batch = []
+
+            for downloader, state in tasks:
+                completed_size = downloader.completed_size
+                speed = (completed_size - state["last_size"]) / self.interval
+
+                state["last_size"] = completed_size
+
+                if downloader.paused:
+                    state["speed"] = None
+                    continue
+
+                # 指数加权平均平滑速度，避免显示值随每秒波动剧烈跳变
+                state["speed"] = speed if state["speed"] is None else self.alpha * speed + (1 - self.alpha) * state["speed"]
+
+                downloader.update_download_info()
+
+                batch.append((downloader.onDownload, self.get_info(downloader, completed_size, state["speed"])))
+
+                event_hub.publish("progress", id = downloader.info["id"], completed_size = completed_size, total_size = downloader.total_size, speed = round(state["speed"]))
+
+            if batch:
+                call_after(self.dispatch, batch)
+
+    def get_info(self, downloader, completed_size: int, speed: float) -> dict:
+        total_size = downloader.total_size
+
+        return {
+            "progress": int(completed_size / total_size * 100) if total_size else 0,
+            "speed": downloader.format_speed(speed / 1024),
+            "eta": format_duration((total_size - completed_size) / speed) if speed > 0 else "--:--",
+            "size": "{}/{}".format(format_size(completed_size / 1024), format_size(total_size / 1024))
+        }
+
+    def dispatch(self, batch: list):
+        for callback, info in batch:
+            callback(info)
+
+progress_monitor = ProgressMonitor()
@@ -0,0 +1,341 @@
+import os
+import struct
+
+class RemuxError(Exception):
+    pass
+
+def iter_boxes(data: bytearray, start: int, end: int):
+    # 依次返回 (类型, 起始位置, 头部长度, 结束位置)
+    offset = start
+
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+
+        if size == 1:
+            size, header_size = struct.unpack_from(">Q", data, offset + 8)[0], 16
+        elif size == 0:
+            size = end - offset
+
+        if size < header_size or offset + size > end:
+            raise RemuxError(f"Invalid box size at {offset}")
+
+        yield box_type.decode("latin-1"), offset, header_size, offset + size
+
+        offset += size
+
+def find_box(data: bytearray, path: list, start: int = 0, end: int = None):
+    # 按路径查找嵌套的 box，如 ["trak", "mdia", "mdhd"]
+    end = len(data) if end is None else end
+
+    for box_type, box_start, header_size, box_end in iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return box_start, header_size, box_end
+
+            return find_box(data, path[1:], box_start + header_size, box_end)
+
+    return None
+
+def get_payload(data: bytearray, path: list) -> int:
+    # 返回 full box 版本号之后的位置，及版本号
+    box = find_box(data, path)
+
+    if not box:
+        raise RemuxError(f"Missing {'/'.join(path)} box")
+
+    offset = box[0] + box[1]
+
+    return offset + 4, data[offset]
+
+def build_box(box_type: str, children: list) -> bytes:
+    payload = b"".join(children)
+
+    return struct.pack(">I4s", len(payload) + 8, box_type.encode("latin-1")) + payload
+
+class FragmentReader:
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.file_size = os.path.getsize(path)
+
+        self.offset = 0
+        self.ftyp = self.moov = None
+
+        try:
+            self.read_header_boxes()
+        except Exception:
+            self.file.close()
+            raise
+
+    def read_header_boxes(self):
+        # moov 之前只保留 ftyp，B 站的 DASH 流在 moov 之后是 sidx 与若干 moof + mdat
+        while self.moov is None:
+            box = self.read_box_header()
+
+            if not box:
+                raise RemuxError("Missing moov box")
+
+            box_type, size = box
+
+            if box_type in ("ftyp", "moov"):
+                setattr(self, box_type, self.read_bytes(self.offset, size))
+
+            elif box_type in ("mdat", "moof"):
+                raise RemuxError("Not a fragmented MP4 file")
+
+            self.offset += size
+
+        if not find_box(self.moov, ["moov", "mvex", "trex"]):
+            raise RemuxError("Not a fragmented MP4 file")
+
+        self.trak = self.get_child(["moov", "trak"])
+        self.trex = self.get_child(["moov", "mvex", "trex"])
+
+        offset, version = get_payload(self.trak, ["trak", "mdia", "mdhd"])
+        self.timescale = struct.unpack_from(">I", self.trak, offset + (16 if version else 8))[0]
+
+    def read_box_header(self) -> tuple:
+        if self.offset + 8 > self.file_size:
+            return None
+
+        self.file.seek(self.offset)
+
+        size, box_type = struct.unpack(">I4s", self.file.read(8))
+
+        if size == 1:
+            size = struct.unpack(">Q", self.file.read(8))[0]
+        elif size == 0:
+            size = self.file_size - self.offset
+
+        if size < 8 or self.offset + size > self.file_size:
+            raise RemuxError(f"Invalid box size at {self.offset}")
+
+        return box_type.decode("latin-1"), size
+
+    def read_bytes(self, offset: int, size: int) -> bytearray:
+        self.file.seek(offset)
+
+        return bytearray(self.file.read(size))
+
+    def get_child(self, path: list) -> bytearray:
+        start, header_size, end = find_box(self.moov, path)
+
+        return self.moov[start:end]
+
+    def fragments(self):
+        # 依次返回 [时间, moof 数据, moof 在原文件中的位置, 其后 mdat 的区间列表]
+        fragment = None
+
+        while True:
+            box = self.read_box_header()
+
+            if not box:
+                break
+
+            box_type, size = box
+
+            if box_type == "moof":
+                if fragment:
+                    yield fragment
+
+                data = self.read_bytes(self.offset, size)
+
+                fragment = [self.get_time(data), data, self.offset, []]
+
+            elif box_type == "mdat" and fragment:
+                fragment[3].append((self.offset, size))
+
+            # sidx、styp、mfra 等记录的是原文件中的位置，合并后不再有效，直接跳过
+
+            self.offset += size
+
+        if fragment:
+            yield fragment
+
+    def get_time(self, moof: bytearray) -> float:
+        # 按 tfdt 的解码时间交错排列音视频分段，缺少 tfdt 时按已读取的比例估算
+        box = find_box(moof, ["moof", "traf", "tfdt"])
+
+        if not box:
+            return self.offset / self.file_size
+
+        offset = box[0] + box[1]
+
+        if moof[offset]:
+            decode_time = struct.unpack_from(">Q", moof, offset + 4)[0]
+        else:
+            decode_time = struct.unpack_from(">I", moof, offset + 4)[0]
+
+        return decode_time / self.timescale
+
+    def close(self):
+        self.file.close()
+
+class FragmentRemuxer:
+    def __init__(self, video_path: str, audio_path: str, output_path: str, buffer_size: int = 1048576):
+        self.video_path, self.audio_path, self.output_path = video_path, audio_path, output_path
+
+        # 所有 mdat 都经由同一块缓冲区复制，内存占用与文件大小无关
+        self.buffer = memoryview(bytearray(buffer_size))
+
+        self.sequence = 0
+
+    def run(self, onProgress = None):
+        readers = []
+
+        try:
+            readers.append(FragmentReader(self.video_path))
+            readers.append(FragmentReader(self.audio_path))
+
+            self.write_output(readers, onProgress)
+
+        finally:
+            for reader in readers:
+                reader.close()
+
+    def write_output(self, readers: list, onProgress = None):
+        total_size, completed_size = sum(reader.file_size for reader in readers), 0
+
+        try:
+            with open(self.output_path, "wb") as output:
+                output.write(readers[0].ftyp or b"")
+                output.write(self.build_moov(*readers))
+
+                # 视频轨道编号为 1，音频为 2，每次写入解码时间最早的分段
+                iterators = {track_id: reader.fragments() for track_id, reader in enumerate(readers, 1)}
+                heads = {track_id: next(iterator, None) for track_id, iterator in iterators.items()}
+
+                while any(heads.values()):
+                    track_id = min((track_id for track_id in heads if heads[track_id]), key = lambda x: heads[x][0])
+
+                    time, moof, moof_offset, mdat_list = heads[track_id]
+
+                    self.write_fragment(output, readers[track_id - 1], track_id, moof, moof_offset, mdat_list)
+
+                    completed_size += len(moof) + sum(size for offset, size in mdat_list)
+
+                    if onProgress:
+                        onProgress(completed_size, total_size)
+
+                    heads[track_id] = next(iterators[track_id], None)
+
+        except Exception:
+            # 不保留写入一半的文件
+            if os.path.exists(self.output_path):
+                os.remove(self.output_path)
+
+            raise
+
+    def build_moov(self, video: FragmentReader, audio: FragmentReader) -> bytes:
+        children = []
+
+        start, header_size, end = find_box(video.moov, ["moov"])
+
+        for box_type, box_start, box_header_size, box_end in iter_boxes(video.moov, start + header_size, end):
+            box = video.moov[box_start:box_end]
+
+            match box_type:
+                case "mvhd":
+                    # next_track_ID 位于 mvhd 末尾
+                    struct.pack_into(">I", box, len(box) - 4, 3)
+
+                    children.append(box)
+
+                case "trak":
+                    children.append(self.set_track_id(video.trak, 1))
+                    children.append(self.set_track_id(audio.trak, 2))
+
+                case "mvex":
+                    mvex_children = [video.moov[mvex_start:mvex_end] for mvex_type, mvex_start, mvex_header_size, mvex_end in iter_boxes(video.moov, box_start + box_header_size, box_end) if mvex_type != "trex"]
+
+                    for track_id, trex in enumerate([video.trex, audio.trex], 1):
+                        trex = trex[:]
+                        struct.pack_into(">I", trex, find_box(trex, ["trex"])[1] + 4, track_id)
+
+                        mvex_children.append(trex)
+
+                    children.append(build_box("mvex", mvex_children))
+
+                case _:
+                    children.append(box)
+
+        return build_box("moov", children)
+
+    def set_track_id(self, trak: bytearray, track_id: int) -> bytearray:
+        trak = trak[:]
+
+        offset, version = get_payload(trak, ["trak", "tkhd"])
+        struct.pack_into(">I", trak, offset + (16 if version else 8), track_id)
+
+        return trak
+
+    def write_fragment(self, output, reader: FragmentReader, track_id: int, moof: bytearray, moof_offset: int, mdat_list: list):
+        self.sequence += 1
+
+        new_offset = output.tell()
+
+        start, header_size, end = find_box(moof, ["moof"])
+
+        for box_type, box_start, box_header_size, box_end in iter_boxes(moof, start + header_size, end):
+            match box_type:
+                case "mfhd":
+                    struct.pack_into(">I", moof, box_start + box_header_size + 4, self.sequence)
+
+                case "traf":
+                    tfhd = find_box(moof, ["tfhd"], box_start + box_header_size, box_end)
+
+                    if not tfhd:
+                        raise RemuxError("Missing tfhd box")
+
+                    offset = tfhd[0] + tfhd[1]
+
+                    struct.pack_into(">I", moof, offset + 4, track_id)
+
+                    # 设置了 base-data-offset 时为文件内的绝对位置，需按 moof 的新位置修正
+                    if moof[offset + 3] & 0x01:
+                        base_offset = struct.unpack_from(">Q", moof, offset + 8)[0]
+
+                        struct.pack_into(">Q", moof, offset + 8, base_offset - moof_offset + new_offset)
+
+        output.write(moof)
+
+        # 读取时跳过的 prft、free 等 box 以同样大小的 free box 代替，moof 与各 mdat 的相对位置不变，trun 中的 data_offset 无需修改
+        position = moof_offset + len(moof)
+
+        for offset, size in mdat_list:
+            if offset > position:
+                self.write_free(output, offset - position)
+
+            self.copy_range(reader.file, offset, size, output)
+
+            position = offset + size
+
+    def write_free(self, output, size: int):
+        if size < 8 or size > 0xFFFFFFFF:
+            raise RemuxError(f"Invalid gap size {size}")
+
+        output.write(struct.pack(">I4s", size, b"free"))
+
+        size -= 8
+
+        while size:
+            padding = min(size, len(self.buffer))
+
+            output.write(bytes(padding))
+
+            size -= padding
+
+    def copy_range(self, file, offset: int, size: int, output):
+        file.seek(offset)
+
+        while size:
+            view = self.buffer[:min(size, len(self.buffer))]
+
+            read_size = file.readinto(view)
+
+            if not read_size:
+                raise RemuxError("Unexpected end of file")
+
+            output.write(view[:read_size])
+
+            size -= read_size
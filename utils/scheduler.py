@@ -0,0 +1,98 @@
+import threading
+
+class SegmentScheduler:
+    def __init__(self, thread_info: dict, min_size: int, reserve: int):
+        # reserve 为工作线程尚未落盘的最大数据量，拆分时需跳过这部分，避免两个分片写入同一区域
+        self.thread_info, self.min_size, self.reserve = thread_info, min_size, reserve
+
+        self.lock = threading.Lock()
+        self.running = set()
+
+        self.index = {}
+
+        for thread_id in thread_info:
+            self.update_index(thread_id)
+
+    def add(self, info: dict, chunk_list: list) -> str:
+        with self.lock:
+            return self.add_segment(info, chunk_list)
+
+    def restore(self, thread_info: dict):
+        with self.lock:
+            self.thread_info.update(thread_info)
+
+            for thread_id in thread_info:
+                self.update_index(thread_id)
+
+    def acquire(self):
+        with self.lock:
+            # 优先领取尚未开始的分片，按文件偏移顺序分配
+            for thread_id, entry in sorted(self.thread_info.items(), key = lambda x: (x[1]["file_name"], x[1]["chunk_list"][0])):
+                if thread_id not in self.running and not self.is_completed(entry):
+                    self.running.add(thread_id)
+
+                    return thread_id
+
+            # 所有分片都已有线程在下载，则从剩余量最大的分片中拆出后半段
+            return self.split()
+
+    def release(self, thread_id: str):
+        with self.lock:
+            self.running.discard(thread_id)
+
+    def reset(self):
+        with self.lock:
+            self.running.clear()
+
+    def split(self):
+        thread_id = max(self.running, key = lambda x: self.get_available(self.thread_info[x]), default = None)
+
+        if thread_id is None:
+            return None
+
+        entry = self.thread_info[thread_id]
+        chunk_list = entry["chunk_list"]
+
+        available = self.get_available(entry)
+
+        if available < self.min_size * 2:
+            return None
+
+        middle = chunk_list[0] + self.reserve + available // 2
+
+        new_thread_id = self.add_segment(entry, [middle, chunk_list[1]])
+        chunk_list[1] = middle - 1
+
+        self.running.add(new_thread_id)
+
+        return new_thread_id
+
+    def add_segment(self, info: dict, chunk_list: list) -> str:
+        key = f"{info['type']}_{info['id']}"
+        self.index[key] = self.index.get(key, 0) + 1
+
+        thread_id = f"{key}_{self.index[key]}"
+
+        temp = info.copy()
+        temp["chunk_list"] = chunk_list
+
+        self.thread_info[thread_id] = temp
+
+        return thread_id
+
+    def update_index(self, thread_id: str):
+        key, index = thread_id.rsplit("_", 1)
+
+        self.index[key] = max(self.index.get(key, 0), int(index))
+
+    def get_available(self, entry: dict) -> int:
+        chunk_list = entry["chunk_list"]
+
+        return chunk_list[1] - chunk_list[0] + 1 - self.reserve
+
+    def is_completed(self, entry: dict) -> bool:
+        return entry["chunk_list"][0] > entry["chunk_list"][1]
+
+    def is_finished(self) -> bool:
+        with self.lock:
+            return all(self.is_completed(entry) for entry in self.thread_info.values())
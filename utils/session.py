@@ -0,0 +1,73 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import Config
+
+class SessionPool:
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self.session = None
+
+    def get_session(self) -> requests.Session:
+        with self.lock:
+            if not self.session:
+                self.session = self.create_session()
+
+            return self.session
+
+    def create_session(self) -> requests.Session:
+        from .tools import get_proxy, get_auth
+
+        session = requests.Session()
+
+        # 每个主机保留的连接数按 并行下载数 × 线程数 × 音视频两路 计算
+        pool_size = max(10, Config.Download.max_thread * Config.Download.max_download * 2)
+
+        adapter = HTTPAdapter(pool_connections = 16, pool_maxsize = pool_size)
+
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        # 代理与身份验证只在创建时设置一次，修改设置后调用 reset 重建
+        session.proxies.update(get_proxy())
+        session.auth = get_auth() if Config.Proxy.auth else None
+
+        return session
+
+    def reset(self):
+        # 正在进行的请求仍持有旧连接，读取完成后随旧 session 一起释放
+        with self.lock:
+            self.session = None
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.get_session().get(url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.get_session().head(url, **kwargs)
+
+    def get_stats(self) -> dict:
+        stats = {}
+
+        if not self.session:
+            return stats
+
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+
+            for key in pools.keys():
+                pool = pools.get(key)
+
+                if not pool:
+                    continue
+
+                # 每新建一个连接计为一次未命中，其余请求均复用了已有连接
+                stats[f"{pool.scheme}://{pool.host}"] = {
+                    "hit": pool.num_requests - pool.num_connections,
+                    "miss": pool.num_connections
+                }
+
+        return stats
+
+session_pool = SessionPool()
@@ -0,0 +1,227 @@
+import os
+import json
+from typing import List
+
+from .config import Config, conf
+from .tools import *
+from .prefetch import playurl_prefetcher
+from .merge import StreamingMerger, run_ffmpeg
+from .remux import FragmentRemuxer
+
+class DownloadUtils:
+    def __init__(self, info: dict, onError: object):
+        self.info, self.onError, self.none_audio = info, onError, False
+
+        self.merger = None
+
+    def get_video_durl(self):
+        json_dash = self.get_video_durl_json()
+
+        self.resolution = json_dash["video"][0]["id"] if json_dash["video"][0]["id"] < self.info["resolution"] else self.info["resolution"]
+
+        temp_video_durl = [i for i in json_dash["video"] if i["id"] == self.resolution]
+
+        self.codec_id = codec_id_map[Config.Download.codec]
+
+        resp = self.has_codec(temp_video_durl, self.codec_id)
+
+        if resp["result"]:
+            self.video_durl = self.get_mirror_urls(temp_video_durl[resp['index']])
+        else:
+            self.video_durl = self.get_mirror_urls(temp_video_durl[0])
+            self.codec_id = 7
+        
+        
+        if json_dash["audio"]:
+            temp_audio_durl = sorted(json_dash["audio"], key = lambda x: x["id"], reverse = True)
+            self.audio_durl = self.get_mirror_urls([i for i in temp_audio_durl if (i["id"] - 30200) == self.resolution or (i["id"] - 30200) < self.resolution][0])
+
+            self.none_audio = False
+        else:
+            self.none_audio = True
+    
+    def get_mirror_urls(self, entry: dict) -> list:
+        # baseUrl 与 backupUrl 指向不同的 CDN 节点，下载前由 mirror_manager 测速排序
+        urls = [entry.get("baseUrl", entry.get("base_url"))] + (entry.get("backupUrl") or entry.get("backup_url") or [])
+
+        return list(dict.fromkeys(filter(None, urls)))
+
+    def get_video_durl_json(self):
+        # 排队期间已由预取线程获取且链接未过期时直接使用
+        json_dash = playurl_prefetcher.get(self.info["id"])
+
+        if json_dash:
+            return json_dash
+
+        try:
+            json_dash = self.request_video_durl_json()
+        except:
+            self.onError()
+
+        return json_dash
+
+    def request_video_durl_json(self) -> dict:
+        match self.info["type"]:
+            case Config.Type.VIDEO:
+                url = f"https://api.bilibili.com/x/player/playurl?bvid={self.info['bvid']}&cid={self.info['cid']}&qn=0&fnver=0&fnval=4048&fourk=1"
+
+                req = session_pool.get(url, headers = get_header(self.info["url"], Config.User.sessdata))
+                resp = json.loads(req.text)
+                    
+                json_dash = resp["data"]["dash"]
+            case Config.Type.BANGUMI:
+                url = f"https://api.bilibili.com/pgc/player/web/playurl?bvid={self.info['bvid']}&cid={self.info['cid']}&qn=0&fnver=0&fnval=4048&fourk=1"
+                
+                req = session_pool.get(url, headers = get_header(self.info["url"], Config.User.sessdata))
+                resp = json.loads(req.text)
+                    
+                json_dash = resp["result"]["dash"]
+
+        return json_dash
+
+    def get_download_info(self) -> list:
+        self.get_video_durl()
+
+        video_info = {
+            "id": self.info["id"],
+            "type": "video",
+            "url": self.video_durl[0],
+            "urls": self.video_durl,
+            "referer_url": self.info["url"],
+            "file_name": "video_{}.mp4".format(self.info["id"]),
+            "resolution": self.resolution,
+            "codec_id": self.codec_id,
+            "chunk_list": []
+        }
+
+        if not self.none_audio:
+            audio_info = {
+                "id": self.info["id"],
+                "type": "audio",
+                "url": self.audio_durl[0],
+                "urls": self.audio_durl,
+                "referer_url": self.info["url"],
+                "file_name": "audio_{}.mp3".format(self.info["id"]),
+                "resolution": self.resolution,
+                "codec_id": self.codec_id,
+                "chunk_list": []
+            }
+
+        return [video_info] if self.none_audio else [video_info, audio_info]
+
+    def get_resume_info(self, thread_info: dict, info_list: list) -> bool:
+        # 清晰度或编码发生变化时，已下载的数据无法继续使用
+        info_map = {entry["type"]: entry for entry in info_list}
+
+        for entry in thread_info.values():
+            new_entry = info_map.get(entry["type"])
+
+            if not new_entry or new_entry["resolution"] != entry.get("resolution") or new_entry["codec_id"] != entry.get("codec_id"):
+                return False
+
+        # 链接过期时替换为重新获取的链接
+        for entry in thread_info.values():
+            if is_url_expired(entry["url"]):
+                entry["url"], entry["urls"] = info_map[entry["type"]]["url"], info_map[entry["type"]]["urls"]
+
+        return True
+        
+    def start_stream_merge(self, downloader):
+        # 边下载边合并，ffmpeg 按顺序读取已写入磁盘的部分，下载完成后只需等待读取剩余数据
+        # 在 UI 线程中调用，ffmpeg 的检查尚未完成时不等待，本次下载完成后再合并
+        if not Config.Download.stream_merge or not conf.is_ffmpeg_ready() or not Config.Download.ffmpeg_available or self.none_audio or self.merger:
+            return
+
+        self.merger = StreamingMerger(downloader, self.get_output_path())
+        self.merger.start(downloader.get_stream_info())
+
+    def is_stream_merging(self) -> bool:
+        return bool(self.merger and self.merger.process)
+
+    def stop_stream_merge(self):
+        if self.merger:
+            self.merger.stop()
+
+    def merge_video(self, onProgress = None) -> bool:
+        # 在合并队列的工作线程中执行，输出文件直接写入下载目录
+        video_path, audio_path = self.get_input_path()
+
+        # 边下载边合并失败时（如 moov 位于文件末尾，无法按顺序读取），改为读取完整文件重新合并
+        if self.merger and self.merger.wait():
+            self.remove_input_files()
+
+            return True
+
+        if self.none_audio:
+            # 只有视频流时无需合并，同一分区内直接重命名
+            try:
+                move_file(video_path, self.get_output_path())
+            except OSError:
+                return False
+
+            return True
+
+        elif conf.wait_ffmpeg():
+            input_size = os.path.getsize(video_path) + os.path.getsize(audio_path)
+
+            returncode = run_ffmpeg(["-i", audio_path, "-i", video_path, "-acodec", "copy", "-vcodec", "copy", self.get_output_path()], get_temp_path(), input_size, onProgress)
+
+            if returncode:
+                return self.remux_video(onProgress)
+
+        else:
+            # 未安装 ffmpeg 时使用内置的 remuxer 合并 DASH 音视频
+            return self.remux_video(onProgress)
+
+        self.remove_input_files()
+
+        return True
+
+    def remux_video(self, onProgress = None) -> bool:
+        try:
+            FragmentRemuxer(*self.get_input_path(), self.get_output_path()).run(self.get_remux_progress(onProgress))
+        except Exception:
+            return False
+
+        self.remove_input_files()
+
+        return True
+
+    def get_input_path(self) -> list:
+        return [os.path.join(get_temp_path(), file_name) for file_name in [f"video_{self.info['id']}.mp4", f"audio_{self.info['id']}.mp3"]]
+
+    def get_output_path(self) -> str:
+        return os.path.join(Config.Download.path, "{}.mp4".format(get_legal_name(self.info["title"])))
+
+    def remove_input_files(self):
+        remove_files(get_temp_path(), [f"video_{self.info['id']}.mp4", f"audio_{self.info['id']}.mp3"])
+
+    def get_remux_progress(self, onProgress):
+        if not onProgress:
+            return None
+
+        state = {"progress": -1}
+
+        def callback(completed_size: int, total_size: int):
+            # 每个分段都会回调，进度变化时才通知界面
+            progress = completed_size * 100 // total_size
+
+            if progress != state["progress"]:
+                state["progress"] = progress
+
+                onProgress(progress)
+
+        return callback
+
+    def has_codec(self, video_durl: List[dict], codec_id: int):
+        for index, entry in enumerate(video_durl):
+            if entry["codecid"] == codec_id:
+                return {
+                    "result": True,
+                    "index": index
+                }
+        
+        return {
+            "result": False,
+            "index": None
+        }
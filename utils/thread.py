@@ -5,15 +5,15 @@ from typing import List
 class Thread(threading.Thread):
     def __init__(self, target = None, args = (), kwargs = None, name = ""):
         threading.Thread.__init__(self, target = target, args = args, kwargs = kwargs, name = name)
-
-        self.kernel32 = ctypes.windll.kernel32
-    
-    def stop(self):    
-        ctypes.pythonapi.PyThreadState_SetAsyncExc(self.ident, ctypes.py_object(SystemExit))
     
     def start(self):
         threading.Thread.start(self)
     
+    @property
+    def kernel32(self):
+        # 挂起与恢复线程只在 Windows 下可用，其他平台创建线程时无需加载 kernel32
+        return ctypes.windll.kernel32
+
     def pause(self):
         handle = self.kernel32.OpenThread(0x0002, False, self.ident)
         self.kernel32.SuspendThread(handle)
@@ -47,11 +47,12 @@ class ThreadPool:
             thread.start()
 
     def stop(self):
-        for thread in self.thread_list:
-            thread.stop()
-        
+        # 线程根据下载器的状态自行退出，这里只等待其结束，不再向线程注入异常
+        self.wait()
+
         self.thread_list.clear()
 
     def wait(self):
-        for thread in self.thread_list:
-            thread.join()
\ No newline at end of file
+        for thread in list(self.thread_list):
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join()
\ No newline at end of file
@@ -0,0 +1,183 @@
+import os
+import hashlib
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from .tools import get_header
+from .session import session_pool
+from .dispatch import call_after
+
+class ThumbnailService:
+    def __init__(self, width: int = 160, height: int = 75, max_workers: int = 4, max_entries: int = 256, max_disk_size: int = 67108864):
+        self.width, self.height = width, height
+        self.max_workers, self.max_entries, self.max_disk_size = max_workers, max_entries, max_disk_size
+
+        self.path = os.path.join(os.getcwd(), "thumbnail")
+
+        self.lock = threading.Lock()
+
+        self.executor = None
+
+        # 解码后的缩略图，按链接缓存在内存中
+        self.memory = OrderedDict()
+
+        # 正在获取的链接及等待结果的回调，多个任务使用同一封面时只请求一次
+        self.pending = {}
+
+        # 已完成但尚未交给 UI 线程的结果，一次回调中全部处理
+        self.batch = []
+
+        self.disk_size = None
+
+        # 默认返回原始数据，图形界面中设置为解码并缩放为图片的函数，在线程池中执行
+        self.decoder = lambda data: data
+
+    def set_decoder(self, decoder):
+        with self.lock:
+            self.decoder = decoder
+
+            self.memory.clear()
+
+    def request(self, url: str, callback):
+        # callback 在 UI 线程中调用，参数为解码后的缩略图；获取失败时不调用
+        if not url:
+            return
+
+        with self.lock:
+            image = self.memory.get(url)
+
+            if image is None:
+                self.submit(url, callback)
+
+                return
+
+            self.memory.move_to_end(url)
+
+            schedule = self.add_batch([(callback, image)])
+
+        if schedule:
+            call_after(self.flush)
+
+    def submit(self, url: str, callback):
+        # 调用时已持有锁
+        if url in self.pending:
+            self.pending[url].append(callback)
+
+            return
+
+        self.pending[url] = [callback]
+
+        if not self.executor:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = self.max_workers, thread_name_prefix = "ThumbnailThread")
+
+        self.executor.submit(self.load, url)
+
+    def load(self, url: str):
+        try:
+            image = self.decoder(self.get_data(url))
+
+        except Exception:
+            image = None
+
+        with self.lock:
+            callback_list = self.pending.pop(url, [])
+
+            if image is None:
+                return
+
+            self.memory[url] = image
+
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last = False)
+
+            schedule = self.add_batch([(callback, image) for callback in callback_list])
+
+        if schedule:
+            call_after(self.flush)
+
+    def add_batch(self, result_list: list) -> bool:
+        # 调用时已持有锁；UI 线程处理上一批结果之前完成的缩略图合并到同一批中，返回是否需要安排新的一批
+        schedule = not self.batch
+
+        self.batch.extend(result_list)
+
+        return schedule
+
+    def flush(self):
+        with self.lock:
+            batch, self.batch = self.batch, []
+
+        for callback, image in batch:
+            callback(image)
+
+    def get_data(self, url: str) -> bytes:
+        file_path = os.path.join(self.path, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+
+            # 更新修改时间，淘汰时按最近使用的时间排序
+            os.utime(file_path)
+
+            return data
+
+        except OSError:
+            pass
+
+        req = session_pool.get(self.get_thumbnail_url(url), headers = get_header(), timeout = 8)
+        req.raise_for_status()
+
+        self.store(file_path, req.content)
+
+        return req.content
+
+    def get_thumbnail_url(self, url: str) -> str:
+        # B 站图床支持在链接后添加尺寸后缀，由服务器返回缩放后的图片，不必下载原图
+        url_info = urlparse(url)
+
+        if url_info.hostname and url_info.hostname.endswith("hdslb.com") and "@" not in url_info.path:
+            return f"{url}@{self.width}w_{self.height}h_1c.jpg"
+
+        return url
+
+    def store(self, file_path: str, data: bytes):
+        try:
+            os.makedirs(self.path, exist_ok = True)
+
+            with open(file_path, "wb") as f:
+                f.write(data)
+
+        except OSError:
+            return
+
+        with self.lock:
+            if self.disk_size is None:
+                self.disk_size = sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.is_file())
+            else:
+                self.disk_size += len(data)
+
+            if self.disk_size > self.max_disk_size:
+                self.evict()
+
+    def evict(self):
+        # 按最近使用的时间淘汰，清理到上限的四分之三，避免每次写入都要遍历目录
+        entry_list = sorted((entry for entry in os.scandir(self.path) if entry.is_file()), key = lambda entry: entry.stat().st_mtime)
+
+        for entry in entry_list:
+            if self.disk_size <= self.max_disk_size * 3 // 4:
+                break
+
+            try:
+                size = entry.stat().st_size
+
+                os.remove(entry.path)
+
+                self.disk_size -= size
+
+            except OSError:
+                pass
+
+thumbnail_service = ThumbnailService()
@@ -1,18 +1,20 @@
 import re
 import os
 import json
-import random
-import ctypes
-import requests
+import time
+import stat
+import itertools
+import shutil
 from requests.auth import HTTPProxyAuth
 
 from .config import Config
+from .session import session_pool
 
 resolution_map = {"超高清 8K": 127, "杜比视界": 126, "真彩 HDR": 125, "超清 4K": 120, "高清 1080P60": 116, "高清 1080P+": 112, "高清 1080P": 80, "高清 720P": 64, "清晰 480P": 32, "流畅 360P": 16}
 codec_id_map = {"AVC": 7, "HEVC": 12, "AV1": 13}
 
 def process_shorklink(url):
-    req = requests.get(url, headers = get_header(), proxies = get_proxy(), auth = get_auth())
+    req = session_pool.get(url, headers = get_header())
     
     return req.url
 
@@ -77,6 +79,20 @@ def format_duration(duration, bangumi = False):
     
     return str(hours).zfill(2) + ":" + str(mins).zfill(2) + ":" + str(secs).zfill(2) if hours != 0 else str(mins).zfill(2) + ":" + str(secs).zfill(2)
 
+def format_episode_entry(id, section, index, title, pic, bvid, cid, duration, badge = ""):
+    # 解析时生成的视频索引，id 为视频在索引中的位置，duration 以秒为单位
+    return {
+        "id": id,
+        "section": section,
+        "index": index,
+        "title": title,
+        "pic": pic,
+        "bvid": bvid,
+        "cid": cid,
+        "duration": duration,
+        "badge": badge
+    }
+
 def format_size(size):
     if size > 1048576:
         return "{:.1f} GB".format(size / 1024 / 1024)
@@ -97,23 +113,46 @@ def get_legal_name(name):
     return re.sub('[/\:*?"<>|]', "", name)
 
 def get_user_face(url):
-    req = requests.get(url, proxies = get_proxy(), auth = get_auth())
+    req = session_pool.get(url)
 
     return req.content
 
 def remove_files(path, name):
     for i in name:
         file_path = os.path.join(path, i)
-        
-        if os.path.exists(file_path):
-            ctypes.windll.kernel32.SetFileAttributesW(file_path, 128)
-            ctypes.windll.kernel32.DeleteFileW(file_path)
+
+        try:
+            # Windows 下无法直接删除只读文件，先清除只读属性
+            if os.name == "nt":
+                os.chmod(file_path, stat.S_IWRITE)
+
+            os.remove(file_path)
+
+        except OSError:
+            pass
+
+def get_temp_path() -> str:
+    # 未单独设置临时目录时，分片下载的文件与输出文件位于同一目录
+    return Config.Download.temp_path or Config.Download.path
+
+def is_same_volume(path: str, directory: str) -> bool:
+    try:
+        return os.stat(path).st_dev == os.stat(directory).st_dev
+    except OSError:
+        return False
+
+def move_file(src: str, dst: str):
+    # 同一分区内只修改目录项，不复制数据；跨分区时才复制后删除源文件
+    if is_same_volume(src, os.path.dirname(dst)):
+        os.replace(src, dst)
+    else:
+        shutil.move(src, dst)
 
 def get_update_json():
     url = "http://api.scott-sloan.cn/Bili23-Downloader/update.json"
 
     try:
-        req = requests.get(url, headers = get_header())
+        req = session_pool.get(url, headers = get_header())
         req.encoding = "utf-8"
 
         update_json = json.loads(req.text)
@@ -130,13 +169,22 @@ def get_update_json():
 def get_changelog(version_code: int):
     url = f"http://api.scott-sloan.cn/Bili23-Downloader/CHANGELOG_{version_code}"
 
-    req = requests.get(url, headers = get_header())
+    req = session_pool.get(url, headers = get_header())
     req.encoding = "utf-8"
 
     return req.text
     
+def is_url_expired(url: str) -> bool:
+    # CDN 链接的 deadline 参数为过期时间戳，预留 1 分钟余量
+    deadline = find_str(r"deadline=([0-9]+)", url)
+
+    return bool(deadline) and int(deadline) < time.time() + 60
+
+# 以启动时的毫秒时间戳为起点递增，同一进程中不会重复，也大于之前运行时保存的任务 id
+id_counter = itertools.count(int(time.time() * 1000))
+
 def get_new_id():
-    return random.randint(1000, 9999)
+    return next(id_counter)
 
 def find_str(pattern, string):
     find = re.findall(pattern, string)
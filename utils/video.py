@@ -1,22 +1,21 @@
 import re
-import json
-import requests
 
 from .config import Config
 from .tools import *
+from .cache import api_cache
 
 class VideoInfo:
     url = aid = bvid = cid = None
 
     title = cover = duration = type = resolution = None
 
-    pages = episodes = resolution_id = resolution_desc = []
+    pages = episodes = episode_list = resolution_id = resolution_desc = []
 
     sections = {}
 
 class VideoParser:
     def __init__(self, onError):
-        self.onError = onError
+        self.onError, self.bypass = onError, False
     
     def get_part(self, url):
         part = re.findall(r"p=([0-9]+)", url)
@@ -45,8 +44,7 @@ class VideoParser:
     def get_video_info(self):
         url = f"https://api.bilibili.com/x/web-interface/view?bvid={VideoInfo.bvid}"
         
-        req = requests.get(url, headers = get_header(VideoInfo.url, cookie = Config.User.sessdata), proxies = get_proxy(), auth = get_auth(), timeout = 8)
-        resp = json.loads(req.text)
+        resp = api_cache.get(url, self.bypass, headers = get_header(VideoInfo.url, cookie = Config.User.sessdata), timeout = 8)
 
         self.check_json(resp, 101)
 
@@ -86,11 +84,21 @@ class VideoParser:
 
                     VideoInfo.sections[section_title] = section_episodes
 
+        self.get_episode_list()
+
+    def get_episode_list(self):
+        # 列表中的节点与下载任务都通过索引中的 id 对应视频，无需按标题查找
+        if VideoInfo.type == 3:
+            episodes = [(key, index + 1, episode["arc"]["title"], episode["arc"]["pic"], episode["bvid"], episode["cid"], episode["arc"]["duration"]) for key, value in VideoInfo.sections.items() for index, episode in enumerate(value)]
+        else:
+            episodes = [("视频", index + 1, page["part"] if VideoInfo.type == 2 else VideoInfo.title, page.get("first_frame", VideoInfo.cover), VideoInfo.bvid, page["cid"], page["duration"]) for index, page in enumerate(VideoInfo.pages)]
+
+        VideoInfo.episode_list = [format_episode_entry(id, *episode) for id, episode in enumerate(episodes)]
+
     def get_video_resolution(self):
         url = f"https://api.bilibili.com/x/player/playurl?bvid={VideoInfo.bvid}&cid={VideoInfo.cid}&qn=0&fnver=0&fnval=4048&fourk=1"
                 
-        req = requests.get(url, headers = get_header(cookie = Config.User.sessdata), proxies = get_proxy(), auth = get_auth(), timeout = 8)
-        resp = json.loads(req.text)
+        resp = api_cache.get(url, self.bypass, headers = get_header(cookie = Config.User.sessdata), timeout = 8)
 
         self.check_json(resp, 102)
 
@@ -99,7 +107,10 @@ class VideoParser:
         VideoInfo.resolution_id = info["accept_quality"]
         VideoInfo.resolution_desc = info["accept_description"]
 
-    def parse_url(self, url):
+    def parse_url(self, url, bypass = False):
+        # bypass 为 True 时忽略缓存，重新请求并更新缓存
+        self.bypass = bypass
+
         self.get_part(url)
 
         if "av" in url:
@@ -0,0 +1,72 @@
+import os
+
+class ChunkWriter:
+    def __init__(self, path: str, chunk_list: list, buffer_size: int, onFlush = None):
+        self.path, self.chunk_list, self.buffer_size, self.onFlush = path, chunk_list, buffer_size, onFlush
+
+        self.buffer = bytearray()
+
+        self.fd = os.open(path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+
+    def write(self, chunk: bytes) -> bool:
+        self.append(chunk)
+
+        if self.full:
+            self.flush()
+
+        return not self.finished
+
+    def append(self, chunk: bytes):
+        # 只加入缓冲区，由调用方决定在何处执行 flush
+        self.buffer.extend(chunk)
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        # 分片的结束位置可能在下载过程中被调整，超出部分直接丢弃
+        offset, end = self.chunk_list[0], self.chunk_list[1]
+        size = min(len(self.buffer), end - offset + 1)
+
+        if size > 0:
+            self.pwrite(memoryview(self.buffer)[:size], offset)
+
+            self.chunk_list[0] += size
+
+            if self.onFlush:
+                self.onFlush(size)
+
+        self.buffer.clear()
+
+    def pwrite(self, data: memoryview, offset: int):
+        if hasattr(os, "pwrite"):
+            while data:
+                written = os.pwrite(self.fd, data, offset)
+
+                data, offset = data[written:], offset + written
+        else:
+            # Windows 下没有 os.pwrite，退化为 seek + write
+            os.lseek(self.fd, offset, os.SEEK_SET)
+
+            while data:
+                data = data[os.write(self.fd, data):]
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            os.close(self.fd)
+
+    @property
+    def full(self) -> bool:
+        return len(self.buffer) >= self.buffer_size
+
+    @property
+    def finished(self) -> bool:
+        return self.chunk_list[0] + len(self.buffer) > self.chunk_list[1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()